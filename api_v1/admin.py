@@ -1,58 +1,215 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Prefetch
+from django.utils.functional import cached_property
 from .models import (User, Product, Category, Supplier, Buyer, Order,
-                     Delivery, OrderItem, DeliveryItem)
+                     Delivery, OrderItem, DeliveryItem, StockAlert,
+                     ReplenishmentSuggestion, Warehouse, WarehouseStock,
+                     DeletionJob, PriceHistory, StockAuditEvent)
+from .pricing import with_prices
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор для больших таблиц: для списка без фильтров на PostgreSQL
+    берет оценку числа строк из статистики планировщика вместо COUNT(*).
+    Маленькие таблицы и отфильтрованные списки считаются точно
+    """
+    estimate_threshold = 100000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE relname = %s',
+                    [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= self.estimate_threshold:
+                return int(row[0])
+        return super().count
 
 
-admin.site.register(OrderItem)
 admin.site.register(User)
 
 
+@admin.register(OrderItem)
+class OrderItemAdmin(admin.ModelAdmin):
+    list_display = ('id', 'order', 'product', 'warehouse', 'quantity')
+    list_select_related = ('order', 'product', 'warehouse')
+    autocomplete_fields = ('product', 'warehouse')
+    raw_id_fields = ('order',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
 @admin.register(DeliveryItem)
 class DeliveryItemAdmin(admin.ModelAdmin):
     list_display = ('id', 'delivery', 'product', 'quantity')
-    pass
+    list_select_related = ('delivery__supplier', 'product')
+    autocomplete_fields = ('product',)
+    raw_id_fields = ('delivery',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name')
-    pass
+    list_display = ('id', 'name', 'is_deleted')
+    list_filter = ('is_deleted',)
+    search_fields = ('name',)
 
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'category', 'quantity', 'price', 'get_total_price')
-    list_filter = ('category__name',)
+    list_display = ('id', 'name', 'category', 'bin_location', 'quantity',
+                    'reorder_point', 'price', 'get_total_price')
+    list_filter = ('category',)
+    list_select_related = ('category',)
+    search_fields = ('name', 'sku')
+    autocomplete_fields = ('category',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Supplier)
 class SupplierAdmin(admin.ModelAdmin):
-    pass
+    search_fields = ('name',)
 
 
 @admin.register(Buyer)
 class BuyerAdmin(admin.ModelAdmin):
-    pass
+    search_fields = ('full_name', 'email')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
+    autocomplete_fields = ('product', 'warehouse')
 
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ('id', 'buyer', 'created_at', 'status',)
+    list_display = ('id', 'buyer', 'created_at', 'status', 'total_values')
+    list_select_related = ('buyer',)
+    autocomplete_fields = ('buyer', 'warehouse')
     inlines = (OrderItemInline,)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        """Позиции заказов на странице загружаются одним запросом с ценами на дату заказа"""
+        return super().get_queryset(request).prefetch_related(
+            Prefetch('items', queryset=with_prices(OrderItem.objects.all(), 'order__created_at'))
+        )
+
+    def total_values(self, obj):
+        return sum(item.get_item_price for item in obj.items.all())
 
 
 class DeliveryItemInline(admin.TabularInline):
     model = DeliveryItem
+    autocomplete_fields = ('product',)
 
 
 @admin.register(Delivery)
 class DeliveryAdmin(admin.ModelAdmin):
     list_display = ('id', 'supplier', 'created_at', 'status', 'items_set', 'total_values')
+    list_select_related = ('supplier',)
+    autocomplete_fields = ('supplier', 'warehouse')
     inlines = (DeliveryItemInline,)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        """
+        Позиции поставок на странице загружаются одним запросом вместе
+        с товарами и ценами на дату поставки, сумма поставки считается
+        по ним же
+        """
+        return super().get_queryset(request).prefetch_related(
+            Prefetch('items', queryset=with_prices(
+                DeliveryItem.objects.select_related('product'), 'delivery__created_at'
+            ))
+        )
 
     def items_set(self, obj):
         return ', '.join(f'{i.product.name} - {i.quantity}' for i in obj.items.all())
+
+    def total_values(self, obj):
+        return sum(item.get_item_price for item in obj.items.all())
+
+
+@admin.register(StockAlert)
+class StockAlertAdmin(admin.ModelAdmin):
+    list_display = ('id', 'product', 'quantity', 'reorder_point', 'delivery',
+                    'created_at', 'resolved_at')
+    list_select_related = ('product', 'delivery__supplier')
+    autocomplete_fields = ('product',)
+    raw_id_fields = ('delivery',)
+
+
+@admin.register(ReplenishmentSuggestion)
+class ReplenishmentSuggestionAdmin(admin.ModelAdmin):
+    list_display = ('product', 'daily_demand', 'lead_time_days', 'safety_stock',
+                    'reorder_point', 'suggested_quantity', 'computed_at')
+    list_select_related = ('product',)
+
+
+class WarehouseStockInline(admin.TabularInline):
+    model = WarehouseStock
+    autocomplete_fields = ('product',)
+
+
+@admin.register(Warehouse)
+class WarehouseAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'address', 'latitude', 'longitude')
+    search_fields = ('name',)
+    inlines = (WarehouseStockInline,)
+
+
+@admin.register(PriceHistory)
+class PriceHistoryAdmin(admin.ModelAdmin):
+    list_display = ('product', 'price', 'valid_from')
+    list_select_related = ('product',)
+    autocomplete_fields = ('product',)
+    date_hierarchy = 'valid_from'
+
+
+@admin.register(DeletionJob)
+class DeletionJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'model', 'object_id', 'status', 'progress',
+                    'created_at', 'heartbeat_at', 'finished_at')
+    list_filter = ('status', 'model')
+
+
+@admin.register(StockAuditEvent)
+class StockAuditEventAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'product_name', 'user', 'delta', 'quantity',
+                    'source', 'object_id')
+    list_filter = ('source',)
+    list_select_related = ('user',)
+    raw_id_fields = ('product', 'user')
+    date_hierarchy = 'created_at'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        """
+        Товары загружаются отдельным запросом, а не через JOIN: у событий
+        удаленных товаров нет пары в таблице товаров, и INNER JOIN
+        по обязательному внешнему ключу скрыл бы их из списка
+        """
+        return super().get_queryset(request).prefetch_related('product')
+
+    def product_name(self, obj):
+        try:
+            return obj.product
+        except Product.DoesNotExist:
+            return f'#{obj.product_id} (удален)'
+    product_name.short_description = 'Товар'
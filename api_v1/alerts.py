@@ -0,0 +1,96 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+from .models import Product, Delivery, DeliveryItem, StockAlert
+from .suppliers import supplier_index
+
+
+def evaluate_reorder_points(product_ids):
+    """
+    Проверяет точки заказа только у переданных товаров.
+
+    Закрывает открытые уведомления у пополненных товаров, создает
+    уведомления для товаров с остатком не выше точки заказа и черновики
+    поставок, сгруппированные по поставщикам категорий этих товаров.
+    Число запросов не зависит от размера каталога.
+    Возвращает список созданных уведомлений.
+    """
+    products = list(
+        Product.objects.filter(id__in=product_ids)
+        .only('id', 'category_id', 'quantity', 'reorder_point', 'reorder_quantity')
+    )
+    low = [p for p in products if p.needs_reorder]
+    restocked = [p.id for p in products if not p.needs_reorder]
+
+    with transaction.atomic():
+        if restocked:
+            StockAlert.objects.filter(
+                product_id__in=restocked, resolved_at__isnull=True
+            ).update(resolved_at=timezone.now())
+        if not low:
+            return []
+
+        alerted = set(
+            StockAlert.objects.filter(product__in=low, resolved_at__isnull=True)
+            .values_list('product_id', flat=True)
+        )
+        low = [p for p in low if p.id not in alerted]
+        if not low:
+            return []
+
+        StockAlert.objects.bulk_create([
+            StockAlert(product=p, quantity=p.quantity, reorder_point=p.reorder_point)
+            for p in low
+        ], ignore_conflicts=True)
+        # bulk_create с ignore_conflicts не возвращает id, поэтому вставленные
+        # уведомления перечитываются. Уведомление, которое успел создать
+        # параллельный вызов, уже связано со своим черновиком поставки
+        alerts = list(StockAlert.objects.filter(
+            product__in=low, resolved_at__isnull=True, delivery__isnull=True
+        ))
+        products = {p.id: p for p in low}
+        _create_draft_deliveries([products[alert.product_id] for alert in alerts])
+    return alerts
+
+
+def _create_draft_deliveries(products):
+    """
+    Создает по одному черновику поставки на поставщика. Товар достается
+    поставщику с наименьшим id среди тех, кто возит его категорию
+    """
+    index = supplier_index.get()
+    by_supplier = defaultdict(list)
+    for product in products:
+        suppliers = index.get(product.category_id)
+        if suppliers:
+            supplier_id, name = suppliers[0]
+            by_supplier[supplier_id].append(product)
+
+    items = []
+    for supplier_id, supplier_products in by_supplier.items():
+        delivery = Delivery.objects.create(supplier_id=supplier_id, status='draft')
+        items.extend(
+            DeliveryItem(
+                delivery=delivery,
+                product=product,
+                quantity=product.get_reorder_quantity
+            )
+            for product in supplier_products
+        )
+        StockAlert.objects.filter(
+            product__in=supplier_products, resolved_at__isnull=True,
+            delivery__isnull=True
+        ).update(delivery=delivery)
+    DeliveryItem.objects.bulk_create(items)
+
+
+def close_delivery_alerts(delivery_ids):
+    """
+    Закрывает открытые уведомления, черновики поставок которых отменены.
+    Открытое уведомление не дает создать новое, поэтому без закрытия
+    товар остался бы без черновика поставки
+    """
+    return StockAlert.objects.filter(
+        delivery_id__in=delivery_ids, resolved_at__isnull=True
+    ).update(resolved_at=timezone.now())
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ApiV1Config(AppConfig):
     name = 'api_v1'
+
+    def ready(self):
+        from . import signals  # noqa: F401
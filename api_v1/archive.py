@@ -0,0 +1,93 @@
+"""
+Перенос закрытых заказов и поставок старше горизонта в архивные таблицы.
+
+Записи переносятся пачками по chunk_size, каждая пачка - отдельная
+короткая транзакция: копирование в архив и удаление из рабочих таблиц
+выполняются вместе, поэтому прерванный перенос можно просто запустить
+заново, он продолжит с первой неперенесенной пачки.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import (Order, OrderItem, Delivery, DeliveryItem, ArchivedOrder,
+                     ArchivedOrderItem, ArchivedDelivery, ArchivedDeliveryItem)
+
+
+def archive_horizon(days=None):
+    """Момент времени, старше которого записи хранятся в архиве"""
+    if days is None:
+        days = settings.ARCHIVE_HORIZON_DAYS
+    return timezone.now() - timedelta(days=days)
+
+
+class Archiver:
+    """Перенос одной пары таблиц (документ и его позиции) в архив"""
+
+    def __init__(self, model, item_model, archive_model, archive_item_model,
+                 fields, item_fields, parent_field):
+        self.model = model
+        self.item_model = item_model
+        self.archive_model = archive_model
+        self.archive_item_model = archive_item_model
+        self.fields = fields
+        self.item_fields = item_fields
+        self.parent_field = parent_field
+
+    def pending(self, before):
+        return self.model.objects.filter(
+            created_at__lt=before,
+            status__in=self.model.ARCHIVABLE_STATUSES
+        )
+
+    def archive_chunk(self, before, chunk_size):
+        """Переносит одну пачку, возвращает число перенесенных документов"""
+        with transaction.atomic():
+            ids = list(
+                self.pending(before).order_by('id')
+                .values_list('id', flat=True)[:chunk_size]
+            )
+            if not ids:
+                return 0
+            self.archive_model.objects.bulk_create(
+                self.archive_model(**row)
+                for row in self.model.objects.filter(id__in=ids).values(*self.fields)
+            )
+            items = self.item_model.objects.filter(**{f'{self.parent_field}__in': ids})
+            self.archive_item_model.objects.bulk_create(
+                self.archive_item_model(**row)
+                for row in items.values(*self.item_fields)
+            )
+            items.delete()
+            self.model.objects.filter(id__in=ids).delete()
+        return len(ids)
+
+    def run(self, before, chunk_size, pause=0, progress=None):
+        total = 0
+        while True:
+            archived = self.archive_chunk(before, chunk_size)
+            if not archived:
+                return total
+            total += archived
+            if progress is not None:
+                progress(total)
+            if pause:
+                time.sleep(pause)
+
+
+order_archiver = Archiver(
+    Order, OrderItem, ArchivedOrder, ArchivedOrderItem,
+    fields=('id', 'buyer_id', 'warehouse_id', 'created_at', 'status',
+            'url_for_qr_code'),
+    item_fields=('order_id', 'product_id', 'warehouse_id', 'quantity'),
+    parent_field='order',
+)
+
+delivery_archiver = Archiver(
+    Delivery, DeliveryItem, ArchivedDelivery, ArchivedDeliveryItem,
+    fields=('id', 'supplier_id', 'warehouse_id', 'created_at', 'status'),
+    item_fields=('delivery_id', 'product_id', 'quantity'),
+    parent_field='delivery',
+)
@@ -0,0 +1,22 @@
+import re
+from . import async_views
+from .streams import stock_changes
+
+
+# Маршруты, которые обслуживаются напрямую из stms_v1/asgi.py
+# асинхронными обработчиками, в обход стека Django.
+# Обрабатываются только GET-запросы, остальные методы уходят в Django
+urlpatterns = [
+    (re.compile(r'^/api/stock/changes/$'), async_views.guard(stock_changes)),
+]
+
+
+def resolve(path, method):
+    """Возвращает обработчик и именованные параметры пути, либо (None, None)"""
+    if method != 'GET':
+        return None, None
+    for pattern, handler in urlpatterns:
+        match = pattern.match(path)
+        if match:
+            return handler, match.groupdict()
+    return None, None
@@ -0,0 +1,107 @@
+"""
+Общие части ASGI-обработчиков, работающих в обход стека Django
+(лента изменений остатков api_v1.streams): проверка Host и ответ 500
+при ошибке (guard), JSON-ответы со сжатием, разбор GET-параметров
+и выполнение запросов к ORM в пуле потоков.
+
+Read-эндпоинты под ASGI обслуживает обычный стек Django: отдельные
+обработчики для них с одним переходом в пул потоков на запрос не
+обгоняли WSGI (benchmarks/read_endpoints.py) и дублировали ViewSet'ы.
+"""
+import io
+import logging
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import DisallowedHost
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+from rest_framework.renderers import JSONRenderer
+from stms_v1.middleware import compressor_for
+
+logger = logging.getLogger(__name__)
+
+
+def scope_compressor(scope):
+    """
+    Компрессор для ответа в обход стека Django по заголовку
+    Accept-Encoding, как в CompressionMiddleware, или None
+    """
+    for name, value in scope['headers']:
+        if name.lower() == b'accept-encoding':
+            compressor_class = compressor_for(value.decode('latin-1'))
+            return compressor_class() if compressor_class else None
+    return None
+
+
+async def json_response(send, status, data, compressor=None):
+    """
+    Отправляет data в формате JSON как полный HTTP-ответ. С compressor
+    тело от COMPRESSION_MIN_SIZE байт сжимается
+    """
+    body = JSONRenderer().render(data)
+    headers = [(b'content-type', b'application/json')]
+    if compressor is not None:
+        headers.append((b'vary', b'Accept-Encoding'))
+        if len(body) >= settings.COMPRESSION_MIN_SIZE:
+            compressed = compressor.compress(body) + compressor.finish()
+            if len(compressed) < len(body):
+                body = compressed
+                headers.append((b'content-encoding', compressor.encoding.encode()))
+    headers.append((b'content-length', str(len(body)).encode()))
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': headers,
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def guard(handler):
+    """
+    Оборачивает ASGI-обработчик, работающий в обход стека Django:
+    проверяет Host по ALLOWED_HOSTS и отвечает 500, если обработчик
+    упал до начала ответа
+    """
+    async def wrapper(scope, receive, send, **kwargs):
+        try:
+            ASGIRequest(scope, io.BytesIO()).get_host()
+        except (DisallowedHost, UnicodeDecodeError) as exc:
+            logging.getLogger('django.security.DisallowedHost').error(exc)
+            await json_response(send, 400, {'detail': 'Bad Request'})
+            return
+
+        started = False
+
+        async def tracked_send(message):
+            nonlocal started
+            started = True
+            await send(message)
+
+        try:
+            await handler(scope, receive, tracked_send, **kwargs)
+        except Exception:
+            logger.exception('Error while handling %s', scope['path'])
+            if started:
+                raise
+            await json_response(send, 500, {'detail': 'Internal Server Error'})
+    return wrapper
+
+
+def query_params(scope):
+    return {
+        key: values[-1]
+        for key, values in parse_qs(scope['query_string'].decode()).items()
+    }
+
+
+async def run_query(func, *args):
+    """Выполняет синхронную функцию, работающую с ORM, в пуле потоков"""
+    def wrapper():
+        close_old_connections()
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+    return await sync_to_async(wrapper)()
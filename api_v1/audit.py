@@ -0,0 +1,117 @@
+"""
+Журнал аудита изменений остатков.
+
+События копятся в памяти процесса и пишутся в БД одним bulk INSERT:
+в конце каждого запроса, при накоплении AUDIT_BUFFER_SIZE событий и при
+завершении процесса. Процессы вне цикла запросов (команда expire_drafts
+с --interval) вызывают buffer.flush() сами после каждого прохода. В буфер попадают только события зафиксированных
+транзакций (transaction.on_commit), откаченные изменения в журнал не
+попадают. Если БД недоступна, события дописываются построчно в JSON
+в файл AUDIT_FALLBACK_FILE, откуда их загружает команда replay_audit.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DatabaseError, connection, transaction
+from django.utils.dateparse import parse_datetime
+from .models import StockAuditEvent
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('product_id', 'user_id', 'delta', 'quantity', 'source', 'object_id')
+
+
+class AuditBuffer:
+    """Буфер событий аудита процесса"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = []
+
+    def add(self, events):
+        with self._lock:
+            self._events.extend(events)
+            full = len(self._events) >= settings.AUDIT_BUFFER_SIZE
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            events, self._events = self._events, []
+        if not events:
+            return 0
+        try:
+            _bulk_create(events)
+        except DatabaseError:
+            logger.exception('Audit flush failed, writing %s events to %s',
+                             len(events), settings.AUDIT_FALLBACK_FILE)
+            write_fallback(events)
+        return len(events)
+
+
+def _bulk_create(events):
+    # Django 3.0 не уменьшает batch_size до предела БД (SQLite)
+    batch_size = min(1000, connection.ops.bulk_batch_size(
+        StockAuditEvent._meta.concrete_fields, events
+    ))
+    StockAuditEvent.objects.bulk_create(events, batch_size=batch_size)
+
+
+buffer = AuditBuffer()
+
+
+def record(events):
+    """Добавляет события в буфер после фиксации текущей транзакции"""
+    if events:
+        transaction.on_commit(lambda: buffer.add(events))
+
+
+def write_fallback(events, filename=None):
+    filename = filename or settings.AUDIT_FALLBACK_FILE
+    lines = []
+    for event in events:
+        row = {field: getattr(event, field) for field in FIELDS}
+        row['created_at'] = event.created_at.isoformat()
+        lines.append(json.dumps(row) + '\n')
+    with open(filename, 'a') as fallback:
+        fallback.writelines(lines)
+
+
+def replay_fallback(filename=None):
+    """
+    Загружает в БД события из резервного файла. Файл сначала
+    переименовывается, чтобы новые события писались в новый файл,
+    и удаляется только после успешной загрузки. Все события загружаются
+    в одной транзакции, поэтому повторный запуск после ошибки не
+    создает дублей
+    """
+    filename = filename or settings.AUDIT_FALLBACK_FILE
+    replaying = f'{filename}.replay'
+    if not os.path.exists(replaying):
+        try:
+            os.replace(filename, replaying)
+        except FileNotFoundError:
+            return 0
+    with open(replaying) as fallback:
+        events = []
+        for line in fallback:
+            row = json.loads(line)
+            row['created_at'] = parse_datetime(row['created_at'])
+            events.append(StockAuditEvent(**row))
+    with transaction.atomic():
+        _bulk_create(events)
+    os.remove(replaying)
+    return len(events)
+
+
+def flush_on_request_finished(sender, **kwargs):
+    buffer.flush()
+
+
+request_finished.connect(flush_on_request_finished, dispatch_uid='audit_flush')
+atexit.register(buffer.flush)
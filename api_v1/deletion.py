@@ -0,0 +1,152 @@
+"""
+Пакетное удаление категорий и поставщиков со всеми зависимыми записями.
+
+Вместо одного Collector на весь граф (он загружает в память все товары,
+позиции заказов и поставок и удаляет их одной транзакцией) граф
+зависимостей обходится сверху вниз: для каждой пачки id сначала пакетно
+удаляются каскадные зависимости, затем сама пачка. Каждая пачка удаляется
+в своей короткой транзакции, поэтому прерванное удаление можно продолжить,
+запустив задачу заново.
+
+Задачу выполняет тот, кто захватил ее условным UPDATE по статусу. Во время
+работы задача обновляет heartbeat_at после каждой пачки. Задача в статусе
+running без обновлений дольше DELETION_JOB_TIMEOUT секунд считается
+брошенной (поток умер вместе с воркером, например при перезапуске
+gunicorn по max_requests), и ее может захватить команда resume_deletions.
+"""
+import json
+import logging
+import threading
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import (Category, Supplier, OrderItem, ArchivedOrderItem,
+                     DeletionJob)
+from .suppliers import supplier_index
+
+logger = logging.getLogger(__name__)
+
+DELETABLE_MODELS = {
+    'category': Category,
+    'supplier': Supplier,
+}
+
+
+def has_history(instance):
+    """
+    Есть ли у объекта история, которую нельзя потерять: позиции заказов
+    с товарами категории или поставки поставщика, включая архивные
+    """
+    if isinstance(instance, Category):
+        return (
+            OrderItem.objects.filter(product__category=instance).exists() or
+            ArchivedOrderItem.objects.filter(product__category=instance).exists()
+        )
+    return (
+        instance.deliveries.exists() or
+        instance.archived_deliveries.exists()
+    )
+
+
+def _cascades(model):
+    """Обратные связи модели с on_delete=CASCADE, включая скрытые (M2M)"""
+    for field in model._meta.get_fields(include_hidden=True):
+        if (field.auto_created and not field.concrete and
+                (field.one_to_many or field.one_to_one) and
+                field.on_delete is models.CASCADE):
+            yield field
+
+
+def delete_in_chunks(queryset, chunk_size, counter, report=None):
+    """
+    Удаляет записи queryset пачками по chunk_size вместе с каскадными
+    зависимостями. counter считает удаленные записи по моделям
+    """
+    model = queryset.model
+    cascades = list(_cascades(model))
+    while True:
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return
+        for relation in cascades:
+            delete_in_chunks(
+                relation.related_model._base_manager.filter(
+                    **{f'{relation.field.name}__in': ids}
+                ),
+                chunk_size, counter, report
+            )
+        with transaction.atomic():
+            deleted, per_model = model._base_manager.filter(pk__in=ids).delete()
+        counter.update({label: count for label, count in per_model.items() if count})
+        if report is not None:
+            report(counter)
+
+
+def start_deletion(instance):
+    """
+    Скрывает объект из списков и запускает его удаление в фоновом потоке
+    после фиксации транзакции. Возвращает задачу удаления
+    """
+    label = next(
+        label for label, model in DELETABLE_MODELS.items()
+        if isinstance(instance, model)
+    )
+    with transaction.atomic():
+        type(instance).objects.filter(pk=instance.pk).update(is_deleted=True)
+        job = DeletionJob.objects.create(model=label, object_id=instance.pk)
+        transaction.on_commit(supplier_index.invalidate)
+        transaction.on_commit(
+            lambda: threading.Thread(target=run_job, args=(job.pk,), daemon=True).start()
+        )
+    return job
+
+
+def claim_job(job_id):
+    """
+    Атомарно переводит задачу в running, если она не выполнена и ее
+    никто не выполняет. Возвращает True, если задача захвачена
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.DELETION_JOB_TIMEOUT)
+    return DeletionJob.objects.filter(pk=job_id).filter(
+        Q(status__in=('pending', 'failed')) |
+        Q(status='running', heartbeat_at__lt=stale) |
+        Q(status='running', heartbeat_at__isnull=True)
+    ).update(status='running', error='', heartbeat_at=now) == 1
+
+
+def run_job(job_id):
+    """
+    Выполняет (или продолжает) задачу удаления. Возвращает задачу или
+    None, если ее уже выполняет другой процесс
+    """
+    if not claim_job(job_id):
+        return None
+    job = DeletionJob.objects.get(pk=job_id)
+    counter = Counter(json.loads(job.progress or '{}'))
+
+    def report(counter):
+        DeletionJob.objects.filter(pk=job.pk).update(
+            progress=json.dumps(counter), heartbeat_at=timezone.now()
+        )
+
+    try:
+        queryset = DELETABLE_MODELS[job.model]._base_manager.filter(pk=job.object_id)
+        delete_in_chunks(queryset, settings.DELETION_CHUNK_SIZE, counter, report)
+    except Exception as exc:
+        logger.exception('Deletion job %s failed', job.pk)
+        job.status = 'failed'
+        job.error = str(exc)
+    else:
+        job.status = 'done'
+    finally:
+        job.progress = json.dumps(counter)
+        job.finished_at = timezone.now()
+        job.save(update_fields=('status', 'error', 'progress', 'finished_at'))
+        if threading.current_thread() is not threading.main_thread():
+            connection.close()
+    return job
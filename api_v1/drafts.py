@@ -0,0 +1,70 @@
+"""
+Отмена просроченных черновиков заказов и поставок.
+
+Черновики ищутся по индексу (status, created_at) и отменяются пачками:
+каждая пачка - отдельная короткая транзакция, в которой черновики
+переводятся в статус cancelled, а товар, списанный черновиками заказов,
+возвращается на остатки суммарными F()-обновлениями по товарам
+(stock.release_orders). Черновики поставок остатков не меняли, у них
+закрываются уведомления о низком остатке, по которым они созданы,
+чтобы при следующем изменении остатка появился новый черновик.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .alerts import close_delivery_alerts
+from .models import Order, Delivery
+from .stock import release_orders
+
+
+def _expire_chunk(model, cutoff, batch_size, on_cancel=None):
+    """Отменяет одну пачку черновиков, возвращает число отмененных"""
+    with transaction.atomic():
+        ids = list(
+            model.objects.select_for_update(skip_locked=True)
+            .filter(status='draft', created_at__lt=cutoff)
+            .order_by('created_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+        model.objects.filter(id__in=ids).update(status='cancelled')
+        if on_cancel is not None:
+            on_cancel(ids)
+    return len(ids)
+
+
+def _expire(model, cutoff, batch_size, on_cancel=None):
+    total = 0
+    while True:
+        expired = _expire_chunk(model, cutoff, batch_size, on_cancel)
+        if not expired:
+            return total
+        total += expired
+
+
+def expire_drafts(order_hours=None, delivery_hours=None, batch_size=None):
+    """
+    Отменяет черновики заказов старше order_hours часов и черновики
+    поставок старше delivery_hours часов. Возвращает число отмененных
+    заказов и поставок и время работы в секундах
+    """
+    now = timezone.now()
+    if order_hours is None:
+        order_hours = settings.DRAFT_ORDER_EXPIRY_HOURS
+    if delivery_hours is None:
+        delivery_hours = settings.DRAFT_DELIVERY_EXPIRY_HOURS
+    batch_size = batch_size or settings.DRAFT_EXPIRY_BATCH_SIZE
+    started = time.monotonic()
+    orders = _expire(Order, now - timedelta(hours=order_hours), batch_size,
+                     release_orders)
+    deliveries = _expire(Delivery, now - timedelta(hours=delivery_hours), batch_size,
+                         close_delivery_alerts)
+    return {
+        'orders': orders,
+        'deliveries': deliveries,
+        'seconds': time.monotonic() - started,
+    }
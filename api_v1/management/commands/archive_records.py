@@ -0,0 +1,48 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from api_v1.archive import archive_horizon, order_archiver, delivery_archiver
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит закрытые заказы и поставки старше горизонта архивации '
+        'в архивные таблицы. Прерванный запуск можно повторить'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.ARCHIVE_HORIZON_DAYS,
+            help='Горизонт архивации в днях'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=settings.ARCHIVE_CHUNK_SIZE,
+            help='Число документов в одной транзакции'
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='Пауза между пачками в секундах'
+        )
+        parser.add_argument(
+            '--only', choices=('orders', 'deliveries'),
+            help='Архивировать только заказы или только поставки'
+        )
+
+    def handle(self, *args, **options):
+        before = archive_horizon(options['days'])
+        archivers = {'orders': order_archiver, 'deliveries': delivery_archiver}
+        if options['only']:
+            archivers = {options['only']: archivers[options['only']]}
+        for name, archiver in archivers.items():
+            started = time.monotonic()
+
+            def progress(total):
+                self.stdout.write(f'{name}: {total} archived')
+
+            total = archiver.run(
+                before, options['chunk_size'], options['pause'], progress
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'{name}: {total} archived in {time.monotonic() - started:.1f}s'
+            ))
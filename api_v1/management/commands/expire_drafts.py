@@ -0,0 +1,53 @@
+import signal
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from api_v1 import audit
+from api_v1.drafts import expire_drafts
+
+
+class Command(BaseCommand):
+    help = (
+        'Отменяет просроченные черновики заказов и поставок и возвращает '
+        'на остатки товар черновиков заказов. Запускается по расписанию '
+        '(cron) или с --interval как постоянный процесс'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--order-hours', type=float, default=settings.DRAFT_ORDER_EXPIRY_HOURS,
+            help='Срок жизни черновика заказа в часах'
+        )
+        parser.add_argument(
+            '--delivery-hours', type=float, default=settings.DRAFT_DELIVERY_EXPIRY_HOURS,
+            help='Срок жизни черновика поставки в часах'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.DRAFT_EXPIRY_BATCH_SIZE,
+            help='Число черновиков в одной транзакции'
+        )
+        parser.add_argument(
+            '--interval', type=float,
+            help='Повторять проверку каждые N секунд'
+        )
+
+    def handle(self, *args, **options):
+        if options['interval']:
+            # SIGTERM завершает процесс через SystemExit, чтобы atexit
+            # успел записать события аудита текущего прохода
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        while True:
+            result = expire_drafts(
+                options['order_hours'], options['delivery_hours'],
+                options['batch_size']
+            )
+            audit.buffer.flush()
+            self.stdout.write(self.style.SUCCESS(
+                f'{result["orders"]} orders and {result["deliveries"]} deliveries '
+                f'cancelled in {result["seconds"]:.2f}s'
+            ))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+from api_v1 import forecasting
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает прогноз спроса и рекомендации по дозаказу товаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='Глубина истории продаж в днях'
+        )
+        parser.add_argument(
+            '--alpha', type=float, default=0.1,
+            help='Коэффициент экспоненциального сглаживания'
+        )
+        parser.add_argument(
+            '--z', type=float, default=1.65,
+            help='Коэффициент уровня сервиса для страхового запаса'
+        )
+        parser.add_argument(
+            '--review-days', type=int, default=7,
+            help='Период между проверками остатков в днях'
+        )
+        parser.add_argument(
+            '--default-lead-time', type=float, default=7,
+            help='Срок пополнения для товаров без истории поставок'
+        )
+        parser.add_argument(
+            '--update-reorder-points', action='store_true',
+            help='Записать рассчитанные точки заказа в товары с продажами за период'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = forecasting.run(
+            days=options['days'],
+            alpha=options['alpha'],
+            z=options['z'],
+            review_days=options['review_days'],
+            default_lead_time=options['default_lead_time'],
+            update_reorder_points=options['update_reorder_points'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {count} products in {time.monotonic() - started:.1f}s'
+        ))
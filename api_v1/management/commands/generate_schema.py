@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from api_v1.yasg import generate_schema, write_schema, VERSION_KEY
+
+
+class Command(BaseCommand):
+    help = 'Генерирует OpenAPI-схему и сохраняет ее в SCHEMA_CACHE_FILE'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default=settings.SCHEMA_CACHE_FILE,
+            help='Путь к файлу схемы'
+        )
+
+    def handle(self, *args, **options):
+        spec = generate_schema()
+        write_schema(spec, options['output'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Schema for version {spec[VERSION_KEY]} written to {options["output"]}'
+        ))
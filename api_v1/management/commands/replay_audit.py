@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from api_v1.audit import replay_fallback
+
+
+class Command(BaseCommand):
+    help = 'Загружает в БД события аудита, записанные в резервный файл'
+
+    def handle(self, *args, **options):
+        loaded = replay_fallback()
+        self.stdout.write(self.style.SUCCESS(f'{loaded} audit events loaded'))
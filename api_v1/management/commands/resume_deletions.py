@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from api_v1.deletion import run_job
+from api_v1.models import DeletionJob
+
+
+class Command(BaseCommand):
+    help = (
+        'Продолжает прерванные и упавшие задачи пакетного удаления. Задачи, '
+        'которые выполняет другой процесс, пропускаются'
+    )
+
+    def handle(self, *args, **options):
+        jobs = DeletionJob.objects.exclude(status='done').order_by('id')
+        for job_id in jobs.values_list('id', flat=True):
+            job = run_job(job_id)
+            if job is None:
+                self.stdout.write(f'Job {job_id}: running in another process, skipped')
+                continue
+            self.stdout.write(f'Job {job.pk} {job.model} #{job.object_id}: '
+                              f'{job.status} {job.progress}')
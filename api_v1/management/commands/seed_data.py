@@ -0,0 +1,78 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from api_v1.seeding import Seeder
+
+SCALES = {
+    'small': dict(users=10, categories=20, products=1000, suppliers=50,
+                  buyers=500, orders=10000, deliveries=2000),
+    'medium': dict(users=100, categories=200, products=50000, suppliers=1000,
+                   buyers=50000, orders=500000, deliveries=50000),
+    'large': dict(users=1000, categories=1000, products=500000, suppliers=10000,
+                  buyers=1000000, orders=3000000, deliveries=300000),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу детерминированными тестовыми данными. Размер задается '
+        'пресетом --scale (large - около 10 млн позиций заказов) или числом '
+        'записей каждой таблицы. Данные добавляются к существующим'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, default='small')
+        for name in SCALES['small']:
+            parser.add_argument(f'--{name}', type=int, help=f'Число записей {name}')
+        parser.add_argument(
+            '--items-per-order', type=int, default=3,
+            help='Среднее число позиций в заказе'
+        )
+        parser.add_argument(
+            '--items-per-delivery', type=int, default=10,
+            help='Среднее число позиций в поставке'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='Период, по которому распределяются даты заказов и поставок'
+        )
+        parser.add_argument(
+            '--epoch', type=date.fromisoformat,
+            help='Дата (ГГГГ-ММ-ДД), от которой отсчитываются даты заказов и '
+                 'поставок. По умолчанию - текущие сутки, и повторный запуск '
+                 'в другой день дает другие даты'
+        )
+        parser.add_argument(
+            '--password', default='password',
+            help='Пароль всех создаваемых пользователей'
+        )
+
+    def handle(self, *args, **options):
+        counts = {
+            name: options[name] if options[name] is not None else default
+            for name, default in SCALES[options['scale']].items()
+        }
+        seeder = Seeder(
+            seed=options['seed'], batch_size=options['batch_size'],
+            password=options['password'], days=options['days'],
+            epoch=options['epoch'], stdout=self.stdout
+        )
+        started = time.monotonic()
+        try:
+            seeder.users(counts['users'])
+            seeder.categories(counts['categories'])
+            seeder.products(counts['products'])
+            seeder.suppliers(counts['suppliers'])
+            seeder.buyers(counts['buyers'])
+            seeder.orders(counts['orders'], options['items_per_order'])
+            seeder.deliveries(counts['deliveries'], options['items_per_delivery'])
+        except ValueError as exc:
+            raise CommandError(exc)
+        finally:
+            seeder.reset_sequences()
+        self.stdout.write(self.style.SUCCESS(
+            f'Done in {time.monotonic() - started:.1f}s'
+        ))
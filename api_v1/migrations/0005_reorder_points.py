@@ -0,0 +1,40 @@
+# Generated by Django 3.0.9 on 2026-10-19 10:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_v1', '0004_stockchange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='reorder_point',
+            field=models.PositiveIntegerField(default=0, help_text='При остатке не больше этого значения создается уведомление и черновик поставки, 0 - не отслеживать', verbose_name='Точка заказа'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='reorder_quantity',
+            field=models.PositiveIntegerField(default=0, help_text='0 - дозаказать до удвоенной точки заказа', verbose_name='Объем дозаказа'),
+        ),
+        migrations.CreateModel(
+            name='StockAlert',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Остаток')),
+                ('reorder_point', models.PositiveIntegerField(verbose_name='Точка заказа')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('resolved_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата закрытия')),
+                ('delivery', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_alerts', to='api_v1.Delivery', verbose_name='Черновик поставки')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_alerts', to='api_v1.Product', verbose_name='Товар')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='stockalert',
+            constraint=models.UniqueConstraint(condition=models.Q(resolved_at__isnull=True), fields=('product',), name='unique_open_stock_alert'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.0.9 on 2026-10-19 10:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_v1', '0005_reorder_points'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReplenishmentSuggestion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('daily_demand', models.FloatField(verbose_name='Прогноз продаж в день')),
+                ('demand_std', models.FloatField(verbose_name='Отклонение продаж в день')),
+                ('lead_time_days', models.FloatField(verbose_name='Срок пополнения, дней')),
+                ('safety_stock', models.PositiveIntegerField(verbose_name='Страховой запас')),
+                ('reorder_point', models.PositiveIntegerField(verbose_name='Точка заказа')),
+                ('suggested_quantity', models.PositiveIntegerField(verbose_name='Рекомендуемый объем заказа')),
+                ('computed_at', models.DateTimeField(verbose_name='Дата расчета')),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='replenishment', to='api_v1.Product', verbose_name='Товар')),
+            ],
+        ),
+    ]
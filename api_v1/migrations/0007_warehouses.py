@@ -0,0 +1,51 @@
+# Generated by Django 3.0.9 on 2026-10-19 10:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_v1', '0006_replenishmentsuggestion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Warehouse',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=128, unique=True, verbose_name='Наименование склада')),
+                ('address', models.CharField(max_length=128, verbose_name='Адрес')),
+                ('latitude', models.FloatField(verbose_name='Широта')),
+                ('longitude', models.FloatField(verbose_name='Долгота')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='delivery',
+            name='warehouse',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='deliveries', to='api_v1.Warehouse', verbose_name='Склад'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='warehouse',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='api_v1.Warehouse', verbose_name='Ближайший склад'),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='warehouse',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api_v1.Warehouse', verbose_name='Склад отгрузки'),
+        ),
+        migrations.CreateModel(
+            name='WarehouseStock',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=0, verbose_name='Количество')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='warehouse_stock', to='api_v1.Product', verbose_name='Товар')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock', to='api_v1.Warehouse', verbose_name='Склад')),
+            ],
+            options={
+                'unique_together': {('warehouse', 'product')},
+            },
+        ),
+    ]
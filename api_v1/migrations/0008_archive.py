@@ -0,0 +1,56 @@
+# Generated by Django 3.0.9 on 2026-10-19 11:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_v1', '0007_warehouses'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedDelivery',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(db_index=True, verbose_name='Дата создания')),
+                ('status', models.CharField(choices=[('active', 'Active'), ('draft', 'Draft')], max_length=6, verbose_name='Статус')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата архивации')),
+                ('supplier', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='archived_deliveries', to='api_v1.Supplier', verbose_name='Поставщик')),
+                ('warehouse', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api_v1.Warehouse', verbose_name='Склад')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(db_index=True, verbose_name='Дата создания заказа')),
+                ('status', models.CharField(choices=[('active', 'Active'), ('draft', 'Draft')], max_length=6, verbose_name='Статус')),
+                ('url_for_qr_code', models.CharField(blank=True, max_length=128, verbose_name='QR код')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата архивации')),
+                ('buyer', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='archived_orders', to='api_v1.Buyer', verbose_name='Покупатель')),
+                ('warehouse', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api_v1.Warehouse', verbose_name='Ближайший склад')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Количество')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='api_v1.ArchivedOrder', verbose_name='Заказ')),
+                ('product', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api_v1.Product', verbose_name='Товар')),
+                ('warehouse', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api_v1.Warehouse', verbose_name='Склад отгрузки')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedDeliveryItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Количество')),
+                ('delivery', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='api_v1.ArchivedDelivery', verbose_name='Поставка')),
+                ('product', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api_v1.Product', verbose_name='Товар')),
+            ],
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 3.0.9 on 2026-10-19 11:05
+
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def seed_price_history(apps, schema_editor):
+    """
+    Текущие цены становятся начальными записями истории: более ранних
+    цен нет, поэтому они действуют для всех существующих документов
+    """
+    Product = apps.get_model('api_v1', 'Product')
+    PriceHistory = apps.get_model('api_v1', 'PriceHistory')
+    valid_from = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    # Django 3.0 не уменьшает batch_size до предела БД (SQLite)
+    batch_size = min(5000, schema_editor.connection.ops.bulk_batch_size(
+        PriceHistory._meta.concrete_fields, [None] * 5000
+    ))
+    PriceHistory.objects.bulk_create(
+        (
+            PriceHistory(product_id=product_id, price=price, valid_from=valid_from)
+            for product_id, price in Product.objects.values_list('id', 'price').iterator()
+        ),
+        batch_size=batch_size
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_v1', '0009_soft_delete'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceHistory',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.PositiveIntegerField(verbose_name='Цена')),
+                ('valid_from', models.DateTimeField(verbose_name='Действует с')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='api_v1.Product', verbose_name='Товар')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='pricehistory',
+            index=models.Index(fields=['product', 'valid_from'], name='price_history_as_of'),
+        ),
+        migrations.RunPython(seed_price_history, migrations.RunPython.noop),
+    ]
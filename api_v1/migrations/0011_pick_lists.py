@@ -0,0 +1,28 @@
+# Generated by Django 3.0.9 on 2026-10-19 11:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_v1', '0010_price_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='bin_location',
+            field=models.CharField(blank=True, help_text='Адрес ячейки на складе, по нему сортируются листы подбора', max_length=32, verbose_name='Ячейка хранения'),
+        ),
+        migrations.AlterField(
+            model_name='archivedorder',
+            name='status',
+            field=models.CharField(choices=[('active', 'Active'), ('draft', 'Draft'), ('fulfilled', 'Fulfilled')], max_length=16, verbose_name='Статус'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('active', 'Active'), ('draft', 'Draft'), ('fulfilled', 'Fulfilled')], default='active', max_length=16, verbose_name='Статус'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.0.9 on 2026-10-19 11:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_v1', '0011_pick_lists'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archiveddelivery',
+            name='status',
+            field=models.CharField(choices=[('active', 'Active'), ('draft', 'Draft'), ('cancelled', 'Cancelled')], max_length=16, verbose_name='Статус'),
+        ),
+        migrations.AlterField(
+            model_name='archivedorder',
+            name='status',
+            field=models.CharField(choices=[('active', 'Active'), ('draft', 'Draft'), ('fulfilled', 'Fulfilled'), ('cancelled', 'Cancelled')], max_length=16, verbose_name='Статус'),
+        ),
+        migrations.AlterField(
+            model_name='delivery',
+            name='status',
+            field=models.CharField(choices=[('active', 'Active'), ('draft', 'Draft'), ('cancelled', 'Cancelled')], default='active', max_length=16, verbose_name='Статус'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('active', 'Active'), ('draft', 'Draft'), ('fulfilled', 'Fulfilled'), ('cancelled', 'Cancelled')], default='active', max_length=16, verbose_name='Статус'),
+        ),
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(fields=['status', 'created_at'], name='delivery_status_created'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'created_at'], name='order_status_created'),
+        ),
+    ]
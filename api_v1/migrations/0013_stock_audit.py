@@ -0,0 +1,41 @@
+# Generated by Django 3.0.9 on 2026-10-19 11:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_v1', '0012_draft_expiry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockAuditEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.IntegerField(verbose_name='Изменение')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Количество после изменения')),
+                ('source', models.CharField(choices=[('order', 'Order'), ('delivery', 'Delivery'), ('product', 'Product')], max_length=16, verbose_name='Источник')),
+                ('object_id', models.PositiveIntegerField(blank=True, null=True, verbose_name='Id заказа или поставки')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата изменения')),
+                ('product', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api_v1.Product', verbose_name='Товар')),
+                ('user', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='stockauditevent',
+            index=models.Index(fields=['product', 'created_at'], name='audit_product_created'),
+        ),
+        migrations.AddIndex(
+            model_name='stockauditevent',
+            index=models.Index(fields=['user', 'created_at'], name='audit_user_created'),
+        ),
+        migrations.AddIndex(
+            model_name='stockauditevent',
+            index=models.Index(fields=['created_at'], name='audit_created'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.0.9 on 2026-10-19 12:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_v1', '0015_order_delivery_created_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='category',
+            name='name',
+            field=models.CharField(max_length=128, verbose_name='Имя категории'),
+        ),
+        migrations.AddConstraint(
+            model_name='category',
+            constraint=models.UniqueConstraint(condition=models.Q(is_deleted=False), fields=('name',), name='category_active_name'),
+        ),
+    ]
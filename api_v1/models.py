@@ -1,6 +1,7 @@
 from django.db import models
 from phonenumber_field.modelfields import PhoneNumberField
 from django.db.models import F, Sum
+from django.utils import timezone
 from django.contrib.auth.models import (AbstractBaseUser, PermissionsMixin,
                                         BaseUserManager,)
 
@@ -56,10 +57,21 @@ class Category(models.Model):
     """Модель категории товаров"""
     name = models.CharField(
         max_length=128,
-        verbose_name='Имя категории',
-        unique=True
+        verbose_name='Имя категории'
+    )
+    is_deleted = models.BooleanField(
+        verbose_name='Удалена',
+        default=False
     )
 
+    class Meta:
+        # Имя удаленной категории можно занять заново
+        constraints = (
+            models.UniqueConstraint(fields=('name',),
+                                    condition=models.Q(is_deleted=False),
+                                    name='category_active_name'),
+        )
+
     def __str__(self):
         return self.name
 
@@ -89,6 +101,23 @@ class Product(models.Model):
     price = models.PositiveIntegerField(
         verbose_name='Цена'
     )
+    reorder_point = models.PositiveIntegerField(
+        verbose_name='Точка заказа',
+        default=0,
+        help_text='При остатке не больше этого значения создается '
+                  'уведомление и черновик поставки, 0 - не отслеживать'
+    )
+    reorder_quantity = models.PositiveIntegerField(
+        verbose_name='Объем дозаказа',
+        default=0,
+        help_text='0 - дозаказать до удвоенной точки заказа'
+    )
+    bin_location = models.CharField(
+        max_length=32,
+        verbose_name='Ячейка хранения',
+        blank=True,
+        help_text='Адрес ячейки на складе, по нему сортируются листы подбора'
+    )
 
     def __str__(self):
         return self.name
@@ -97,6 +126,16 @@ class Product(models.Model):
     def get_total_price(self):
         return self.price * self.quantity
 
+    @property
+    def needs_reorder(self):
+        return bool(self.reorder_point) and self.quantity <= self.reorder_point
+
+    @property
+    def get_reorder_quantity(self):
+        if self.reorder_quantity:
+            return self.reorder_quantity
+        return max(self.reorder_point * 2 - self.quantity, 1)
+
 
 class Supplier(models.Model):
     """Модель поставщиков"""
@@ -128,42 +167,116 @@ class Supplier(models.Model):
         verbose_name='Категории поставляемых товаров',
         blank=True,
     )
+    is_deleted = models.BooleanField(
+        verbose_name='Удален',
+        default=False
+    )
+
+    def __str__(self):
+        return self.name
+
+
+class Warehouse(models.Model):
+    """Модель склада"""
+    name = models.CharField(
+        max_length=128,
+        verbose_name='Наименование склада',
+        unique=True
+    )
+    address = models.CharField(
+        max_length=128,
+        verbose_name='Адрес'
+    )
+    latitude = models.FloatField(
+        verbose_name='Широта'
+    )
+    longitude = models.FloatField(
+        verbose_name='Долгота'
+    )
 
     def __str__(self):
         return self.name
 
 
+class WarehouseStock(models.Model):
+    """
+    Остаток товара на складе. Сумма остатков по складам не больше
+    Product.quantity, разница - остаток, не привязанный к складу
+    """
+    warehouse = models.ForeignKey(
+        Warehouse,
+        on_delete=models.CASCADE,
+        related_name='stock',
+        verbose_name='Склад'
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='warehouse_stock',
+        verbose_name='Товар'
+    )
+    quantity = models.PositiveIntegerField(
+        verbose_name='Количество',
+        default=0
+    )
+
+    class Meta:
+        unique_together = ('warehouse', 'product')
+
+
 class Delivery(models.Model):
     """Модель поставки товаров"""
 
     STATUS_CHOICES = (
         ('active', 'Active'),
         ('draft', 'Draft'),
+        ('cancelled', 'Cancelled'),
     )
+    # Статусы, в которых запись закрыта и может уйти в архив
+    ARCHIVABLE_STATUSES = ('active', 'cancelled')
     supplier = models.ForeignKey(
         Supplier,
         related_name='deliveries',
         on_delete=models.CASCADE,
         verbose_name='Поставщик'
     )
+    warehouse = models.ForeignKey(
+        Warehouse,
+        related_name='deliveries',
+        on_delete=models.SET_NULL,
+        verbose_name='Склад',
+        null=True,
+        blank=True
+    )
     created_at = models.DateTimeField(
         verbose_name='Дата создания',
         auto_now_add=True
     )
     status = models.CharField(
-        max_length=6,
+        max_length=16,
         choices=STATUS_CHOICES,
         default='active',
         verbose_name='Статус'
     )
     # items = models.ManyToManyField(Product, through='DeliveryItem')
 
+    class Meta:
+        indexes = (
+            models.Index(fields=('status', 'created_at'),
+                         name='delivery_status_created'),
+            models.Index(fields=('created_at', 'id'),
+                         name='delivery_created_id'),
+        )
+
     def __str__(self):
         return f'{self.created_at.date()} by {self.supplier}'
 
     @property
     def total_values(self):
-        values = self.items.annotate(item_value=F('quantity') * F('product__price')).aggregate(total=Sum('item_value'))
+        from .pricing import with_prices
+        values = with_prices(self.items.all(), 'delivery__created_at').aggregate(
+            total=Sum(F('quantity') * F('unit_price'))
+        )
         return values['total']
 
 
@@ -186,7 +299,16 @@ class DeliveryItem(models.Model):
 
     @property
     def get_item_price(self):
-        return self.product.price * self.quantity
+        """
+        Стоимость позиции по цене на дату поставки. Цена берется из
+        аннотации unit_price (pricing.with_prices), а без нее - отдельным
+        запросом к истории цен
+        """
+        unit_price = getattr(self, 'unit_price', None)
+        if unit_price is None:
+            from .pricing import price_at
+            unit_price = price_at(self.product, self.delivery.created_at)
+        return unit_price * self.quantity
 
 
 class Buyer(models.Model):
@@ -216,19 +338,31 @@ class Order(models.Model):
     STATUS_CHOICES = (
         ('active', 'Active'),
         ('draft', 'Draft'),
+        ('fulfilled', 'Fulfilled'),
+        ('cancelled', 'Cancelled'),
     )
+    # Статусы, в которых запись закрыта и может уйти в архив
+    ARCHIVABLE_STATUSES = ('fulfilled', 'cancelled')
     buyer = models.ForeignKey(
         Buyer,
         related_name='orders',
         on_delete=models.CASCADE,
         verbose_name='Покупатель'
     )
+    warehouse = models.ForeignKey(
+        Warehouse,
+        related_name='orders',
+        on_delete=models.SET_NULL,
+        verbose_name='Ближайший склад',
+        null=True,
+        blank=True
+    )
     created_at = models.DateTimeField(
         verbose_name='Дата создания заказа',
         auto_now_add=True
     )
     status = models.CharField(
-        max_length=6,
+        max_length=16,
         choices=STATUS_CHOICES,
         default='active',
         verbose_name='Статус'
@@ -239,6 +373,14 @@ class Order(models.Model):
         blank=True
     )
 
+    class Meta:
+        indexes = (
+            models.Index(fields=('status', 'created_at'),
+                         name='order_status_created'),
+            models.Index(fields=('created_at', 'id'),
+                         name='order_created_id'),
+        )
+
 
 class OrderItem(models.Model):
     """Модель товаров в заказе"""
@@ -253,6 +395,377 @@ class OrderItem(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Товар',
     )
+    warehouse = models.ForeignKey(
+        Warehouse,
+        on_delete=models.SET_NULL,
+        verbose_name='Склад отгрузки',
+        null=True,
+        blank=True
+    )
+    quantity = models.PositiveIntegerField(
+        verbose_name='Количество'
+    )
+
+    @property
+    def get_item_price(self):
+        """Стоимость позиции по цене на дату заказа, см. DeliveryItem"""
+        unit_price = getattr(self, 'unit_price', None)
+        if unit_price is None:
+            from .pricing import price_at
+            unit_price = price_at(self.product, self.order.created_at)
+        return unit_price * self.quantity
+
+
+class PriceHistory(models.Model):
+    """
+    История цен товара. Цена действует с valid_from до начала следующей
+    записи, цена на момент времени ищется по индексу (product, valid_from)
+    """
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='price_history',
+        verbose_name='Товар'
+    )
+    price = models.PositiveIntegerField(
+        verbose_name='Цена'
+    )
+    valid_from = models.DateTimeField(
+        verbose_name='Действует с'
+    )
+
+    class Meta:
+        indexes = (
+            models.Index(fields=('product', 'valid_from'),
+                         name='price_history_as_of'),
+        )
+
+    def __str__(self):
+        return f'{self.product}: {self.price} from {self.valid_from}'
+
+
+class StockChange(models.Model):
+    """
+    Журнал изменений остатков товаров, используется как лента изменений
+    для подписчиков, курсором служит id записи
+    """
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='stock_changes',
+        verbose_name='Товар'
+    )
+    quantity = models.PositiveIntegerField(
+        verbose_name='Количество после изменения'
+    )
+    created_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now_add=True
+    )
+
+
+class StockAuditEvent(models.Model):
+    """
+    Событие журнала аудита: кто, когда и на сколько изменил остаток
+    товара. Внешние ключи без ограничений в БД, чтобы журнал переживал
+    удаление товаров и пользователей
+    """
+    SOURCE_CHOICES = (
+        ('order', 'Order'),
+        ('delivery', 'Delivery'),
+        ('product', 'Product'),
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+',
+        verbose_name='Товар'
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+',
+        verbose_name='Пользователь',
+        null=True,
+        blank=True
+    )
+    delta = models.IntegerField(
+        verbose_name='Изменение'
+    )
+    quantity = models.PositiveIntegerField(
+        verbose_name='Количество после изменения'
+    )
+    source = models.CharField(
+        max_length=16,
+        choices=SOURCE_CHOICES,
+        verbose_name='Источник'
+    )
+    object_id = models.PositiveIntegerField(
+        verbose_name='Id заказа или поставки',
+        null=True,
+        blank=True
+    )
+    created_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        default=timezone.now
+    )
+
+    class Meta:
+        indexes = (
+            models.Index(fields=('product', 'created_at'), name='audit_product_created'),
+            models.Index(fields=('user', 'created_at'), name='audit_user_created'),
+            models.Index(fields=('created_at',), name='audit_created'),
+        )
+
+
+class StockAlert(models.Model):
+    """
+    Уведомление о низком остатке товара. Для товара может быть только
+    одно открытое уведомление, оно закрывается при пополнении остатка
+    """
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='stock_alerts',
+        verbose_name='Товар'
+    )
+    quantity = models.PositiveIntegerField(
+        verbose_name='Остаток'
+    )
+    reorder_point = models.PositiveIntegerField(
+        verbose_name='Точка заказа'
+    )
+    delivery = models.ForeignKey(
+        Delivery,
+        on_delete=models.SET_NULL,
+        related_name='stock_alerts',
+        verbose_name='Черновик поставки',
+        null=True,
+        blank=True
+    )
+    created_at = models.DateTimeField(
+        verbose_name='Дата создания',
+        auto_now_add=True
+    )
+    resolved_at = models.DateTimeField(
+        verbose_name='Дата закрытия',
+        null=True,
+        blank=True
+    )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('product',),
+                condition=models.Q(resolved_at__isnull=True),
+                name='unique_open_stock_alert'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.product}: {self.quantity} <= {self.reorder_point}'
+
+
+class ReplenishmentSuggestion(models.Model):
+    """Рекомендация по дозаказу товара, пересчитывается прогнозом спроса"""
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='replenishment',
+        verbose_name='Товар'
+    )
+    daily_demand = models.FloatField(
+        verbose_name='Прогноз продаж в день'
+    )
+    demand_std = models.FloatField(
+        verbose_name='Отклонение продаж в день'
+    )
+    lead_time_days = models.FloatField(
+        verbose_name='Срок пополнения, дней'
+    )
+    safety_stock = models.PositiveIntegerField(
+        verbose_name='Страховой запас'
+    )
+    reorder_point = models.PositiveIntegerField(
+        verbose_name='Точка заказа'
+    )
+    suggested_quantity = models.PositiveIntegerField(
+        verbose_name='Рекомендуемый объем заказа'
+    )
+    computed_at = models.DateTimeField(
+        verbose_name='Дата расчета'
+    )
+
+
+class ArchivedOrder(models.Model):
+    """
+    Архивный заказ. Ключи сохраняются из исходных таблиц, внешние ключи
+    без ограничений в БД, чтобы архив не мешал удалению справочников
+    """
+    id = models.IntegerField(
+        primary_key=True
+    )
+    buyer = models.ForeignKey(
+        Buyer,
+        related_name='archived_orders',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        verbose_name='Покупатель'
+    )
+    warehouse = models.ForeignKey(
+        Warehouse,
+        related_name='+',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        verbose_name='Ближайший склад',
+        null=True
+    )
+    created_at = models.DateTimeField(
+        verbose_name='Дата создания заказа',
+        db_index=True
+    )
+    status = models.CharField(
+        max_length=16,
+        choices=Order.STATUS_CHOICES,
+        verbose_name='Статус'
+    )
+    url_for_qr_code = models.CharField(
+        max_length=128,
+        verbose_name='QR код',
+        blank=True
+    )
+    archived_at = models.DateTimeField(
+        verbose_name='Дата архивации',
+        auto_now_add=True
+    )
+
+
+class ArchivedOrderItem(models.Model):
+    """Товар в архивном заказе"""
+    order = models.ForeignKey(
+        ArchivedOrder,
+        on_delete=models.CASCADE,
+        related_name='items',
+        verbose_name='Заказ'
+    )
+    product = models.ForeignKey(
+        Product,
+        related_name='+',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        verbose_name='Товар'
+    )
+    warehouse = models.ForeignKey(
+        Warehouse,
+        related_name='+',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        verbose_name='Склад отгрузки',
+        null=True
+    )
     quantity = models.PositiveIntegerField(
         verbose_name='Количество'
     )
+
+
+class ArchivedDelivery(models.Model):
+    """Архивная поставка"""
+    id = models.IntegerField(
+        primary_key=True
+    )
+    supplier = models.ForeignKey(
+        Supplier,
+        related_name='archived_deliveries',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        verbose_name='Поставщик'
+    )
+    warehouse = models.ForeignKey(
+        Warehouse,
+        related_name='+',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        verbose_name='Склад',
+        null=True
+    )
+    created_at = models.DateTimeField(
+        verbose_name='Дата создания',
+        db_index=True
+    )
+    status = models.CharField(
+        max_length=16,
+        choices=Delivery.STATUS_CHOICES,
+        verbose_name='Статус'
+    )
+    archived_at = models.DateTimeField(
+        verbose_name='Дата архивации',
+        auto_now_add=True
+    )
+
+
+class ArchivedDeliveryItem(models.Model):
+    """Товар в архивной поставке"""
+    delivery = models.ForeignKey(
+        ArchivedDelivery,
+        on_delete=models.CASCADE,
+        related_name='items',
+        verbose_name='Поставка'
+    )
+    product = models.ForeignKey(
+        Product,
+        related_name='+',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        verbose_name='Товар'
+    )
+    quantity = models.PositiveIntegerField(
+        verbose_name='Количество'
+    )
+
+
+class DeletionJob(models.Model):
+    """Фоновое пакетное удаление категории или поставщика со всеми зависимыми записями"""
+
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    model = models.CharField(
+        max_length=64,
+        verbose_name='Модель'
+    )
+    object_id = models.PositiveIntegerField(
+        verbose_name='id объекта'
+    )
+    status = models.CharField(
+        max_length=7,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name='Статус'
+    )
+    progress = models.TextField(
+        verbose_name='Удалено записей по моделям',
+        blank=True
+    )
+    error = models.TextField(
+        verbose_name='Ошибка',
+        blank=True
+    )
+    created_at = models.DateTimeField(
+        verbose_name='Дата создания',
+        auto_now_add=True
+    )
+    heartbeat_at = models.DateTimeField(
+        verbose_name='Последняя активность',
+        null=True,
+        blank=True
+    )
+    finished_at = models.DateTimeField(
+        verbose_name='Дата завершения',
+        null=True,
+        blank=True
+    )
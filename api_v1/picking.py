@@ -0,0 +1,105 @@
+"""
+Листы подбора для волны активных заказов.
+
+Волна - самые старые активные заказы, не больше size штук. Позиции всех
+заказов волны сворачиваются одним агрегирующим запросом в строки
+"склад, товар, количество", строки каждого склада сортируются по ячейке
+хранения товара, чтобы сборщик прошел склад за один обход.
+"""
+from itertools import groupby
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from rest_framework.renderers import BaseRenderer
+from .models import Order, OrderItem
+
+
+def wave_orders():
+    """Активные заказы в порядке очереди на сборку"""
+    return Order.objects.filter(status='active').order_by('created_at', 'id')
+
+
+def pick_lines(order_ids):
+    """
+    Сводные строки подбора по заказам order_ids, отсортированные по
+    складу и ячейке хранения
+    """
+    return (
+        OrderItem.objects
+        .filter(order_id__in=order_ids)
+        .values('warehouse_id', 'warehouse__name', 'product_id', 'product__name',
+                'product__sku', 'product__bin_location')
+        .annotate(quantity=Sum('quantity'), orders=Count('order_id', distinct=True))
+        .order_by('warehouse_id', 'product__bin_location', 'product__name')
+    )
+
+
+def build_pick_lists(order_ids):
+    """Листы подбора по складам в виде, пригодном для сериализации"""
+    pick_lists = []
+    for warehouse_id, lines in groupby(pick_lines(order_ids),
+                                       key=lambda line: line['warehouse_id']):
+        lines = list(lines)
+        pick_lists.append({
+            'warehouse': warehouse_id,
+            'warehouse_name': lines[0]['warehouse__name'] or '',
+            'lines': [
+                {
+                    'bin_location': line['product__bin_location'],
+                    'product': line['product_id'],
+                    'name': line['product__name'],
+                    'sku': line['product__sku'],
+                    'quantity': line['quantity'],
+                    'orders': line['orders'],
+                }
+                for line in lines
+            ],
+        })
+    return {'orders': order_ids, 'pick_lists': pick_lists}
+
+
+def preview_wave(size):
+    """Листы подбора для следующей волны без изменения заказов"""
+    order_ids = list(wave_orders().values_list('id', flat=True)[:size])
+    return build_pick_lists(order_ids)
+
+
+def fulfil_wave(size):
+    """
+    Формирует волну и помечает ее заказы выполненными одним UPDATE.
+    Заказы блокируются с skip_locked, поэтому одновременно формируемые
+    волны не пересекаются
+    """
+    with transaction.atomic():
+        order_ids = list(
+            wave_orders().select_for_update(skip_locked=True)
+            .values_list('id', flat=True)[:size]
+        )
+        pick_lists = build_pick_lists(order_ids)
+        Order.objects.filter(id__in=order_ids, status='active').update(status='fulfilled')
+    return pick_lists
+
+
+class PickListTextRenderer(BaseRenderer):
+    """Листы подбора в текстовом виде для печати"""
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if 'pick_lists' not in data:
+            return '\n'.join(f'{key}: {value}' for key, value in data.items()).encode()
+        pages = []
+        for pick_list in data['pick_lists']:
+            title = pick_list['warehouse_name'] or 'Без склада'
+            rows = [
+                f'Лист подбора: {title}, заказов: {len(data["orders"])}',
+                f'{"Ячейка":<12} {"Артикул":<20} {"Товар":<40} {"Кол-во":>8}',
+            ]
+            rows.extend(
+                f'{line["bin_location"]:<12} {line["sku"]:<20} '
+                f'{line["name"][:40]:<40} {line["quantity"]:>8}'
+                for line in pick_list['lines']
+            )
+            pages.append('\n'.join(rows))
+        return ('\n\f\n'.join(pages) + '\n').encode(self.charset)
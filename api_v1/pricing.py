@@ -0,0 +1,50 @@
+"""
+Цены товаров на момент времени.
+
+Product.price хранит только текущую цену, поэтому стоимость поставок
+и заказов считается по истории цен (PriceHistory): для позиции берется
+последняя запись товара с valid_from не позже даты документа. Поиск идет
+по индексу (product, valid_from), для набора позиций - одним запросом
+с коррелированным подзапросом на каждую строку.
+"""
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from .models import PriceHistory
+
+
+def price_at(product, moment):
+    """Цена товара на момент moment, без истории - текущая цена"""
+    price = (
+        PriceHistory.objects
+        .filter(product_id=product.pk, valid_from__lte=moment)
+        .order_by('-valid_from')
+        .values_list('price', flat=True)
+        .first()
+    )
+    return product.price if price is None else price
+
+
+def price_as_of(moment_field, product_field='product'):
+    """
+    Выражение цены товара из product_field на момент из moment_field
+    для использования в annotate
+    """
+    return Coalesce(
+        Subquery(
+            PriceHistory.objects
+            .filter(product=OuterRef(product_field),
+                    valid_from__lte=OuterRef(moment_field))
+            .order_by('-valid_from')
+            .values('price')[:1]
+        ),
+        f'{product_field}__price'
+    )
+
+
+def with_prices(queryset, moment_field, product_field='product'):
+    """
+    Добавляет к позициям заказов или поставок поле unit_price - цену
+    товара на дату документа, например
+    with_prices(OrderItem.objects.all(), 'order__created_at')
+    """
+    return queryset.annotate(unit_price=price_as_of(moment_field, product_field))
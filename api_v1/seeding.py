@@ -0,0 +1,232 @@
+"""
+Генерация тестовых данных большого объема.
+
+Данные детерминированы: при одинаковых seed, размерах и epoch получается
+один и тот же набор. Даты заказов и поставок отсчитываются назад от epoch,
+по умолчанию - от начала текущих суток (UTC), поэтому без явного epoch
+набор повторяется только в пределах одних суток. Записи создаются с явными id через bulk_create пачками,
+без сигналов и save() на каждую запись: пароль хешируется один раз на
+всех пользователей, телефоны берутся из заранее проверенного пула,
+created_at заказов и поставок задается явно (auto_now_add на время
+загрузки отключается). После загрузки сдвигаются последовательности id.
+"""
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import islice
+
+import phonenumbers
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from .models import (User, Category, Product, PriceHistory, Supplier, Buyer,
+                     Order, OrderItem, Delivery, DeliveryItem)
+
+PRICE_HISTORY_START = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+@contextmanager
+def disable_auto_now_add(*models):
+    """Позволяет задать created_at явно при bulk_create"""
+    fields = [
+        field for model in models for field in model._meta.local_fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def phone_pool(rng, size=1000):
+    """Пул валидных московских номеров"""
+    pool = []
+    while len(pool) < size:
+        number = f'+7495{rng.randrange(10 ** 7):07d}'
+        if phonenumbers.is_valid_number(phonenumbers.parse(number)):
+            pool.append(number)
+    return pool
+
+
+def next_id(model):
+    return (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+
+
+class Seeder:
+    """Заполняет таблицы api_v1 данными заданного размера"""
+
+    def __init__(self, seed=0, batch_size=5000, password='password', days=365,
+                 epoch=None, stdout=None):
+        self.seed = seed
+        self.batch_size = batch_size
+        self.password = password
+        self.days = days
+        self.stdout = stdout
+        epoch = epoch or timezone.now().date()
+        self.now = datetime(epoch.year, epoch.month, epoch.day, tzinfo=dt_timezone.utc)
+
+    def rng(self, name):
+        """Отдельный генератор на таблицу, чтобы таблицы не зависели друг от друга"""
+        return random.Random(f'{self.seed}:{name}')
+
+    def log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message)
+
+    def insert(self, model, objects):
+        """Вставляет объекты из генератора пачками, возвращает их число"""
+        started = time.monotonic()
+        objects = iter(objects)
+        total = 0
+        while True:
+            batch = list(islice(objects, self.batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+            total += len(batch)
+        self.log(f'{model._meta.label}: {total} rows in {time.monotonic() - started:.1f}s')
+        return total
+
+    def required_ids(self, model, count, dependent):
+        """
+        id записей model, на которые ссылаются count создаваемых записей
+        dependent. Если ссылаться не на что, создать их нельзя
+        """
+        ids = list(model.objects.values_list('id', flat=True))
+        if count and not ids:
+            raise ValueError(
+                f'Cannot create {dependent._meta.verbose_name_plural} '
+                f'without {model._meta.verbose_name_plural}'
+            )
+        return ids
+
+    def created_at(self, rng):
+        return self.now - timedelta(seconds=rng.randrange(self.days * 86400))
+
+    def users(self, count):
+        start = next_id(User)
+        password = make_password(self.password)
+        self.insert(User, (
+            User(id=i, username=f'user{i}', email=f'user{i}@example.com',
+                 password=password)
+            for i in range(start, start + count)
+        ))
+
+    def categories(self, count):
+        start = next_id(Category)
+        self.insert(Category, (
+            Category(id=i, name=f'Category {i}')
+            for i in range(start, start + count)
+        ))
+
+    def products(self, count):
+        rng = self.rng('products')
+        category_ids = self.required_ids(Category, count, Product)
+        start = next_id(Product)
+        prices = {}
+
+        def generate():
+            for i in range(start, start + count):
+                price = prices[i] = rng.randint(10, 100000)
+                yield Product(
+                    id=i, name=f'Product {i}', sku=f'SKU-{i:010d}',
+                    category_id=rng.choice(category_ids),
+                    quantity=rng.randint(0, 1000), price=price,
+                    bin_location=f'{rng.choice("ABCDEFGH")}-{rng.randint(1, 99):02d}-{rng.randint(1, 9)}'
+                )
+
+        self.insert(Product, generate())
+        self.insert(PriceHistory, (
+            PriceHistory(product_id=i, price=price, valid_from=PRICE_HISTORY_START)
+            for i, price in prices.items()
+        ))
+
+    def suppliers(self, count, categories_per_supplier=3):
+        rng = self.rng('suppliers')
+        phones = phone_pool(rng)
+        category_ids = list(Category.objects.values_list('id', flat=True))
+        start = next_id(Supplier)
+        self.insert(Supplier, (
+            Supplier(
+                id=i, name=f'Supplier {i}', address=f'Address {i}',
+                bank_details=f'{rng.randrange(10 ** 20):020d}',
+                contact_person=f'Contact {i}', phone_number=rng.choice(phones),
+                email=f'supplier{i}@example.com'
+            )
+            for i in range(start, start + count)
+        ))
+        through = Supplier.product_category.through
+        self.insert(through, (
+            through(supplier_id=i, category_id=category_id)
+            for i in range(start, start + count)
+            for category_id in rng.sample(
+                category_ids, min(categories_per_supplier, len(category_ids))
+            )
+        ))
+
+    def buyers(self, count):
+        rng = self.rng('buyers')
+        phones = phone_pool(rng)
+        start = next_id(Buyer)
+        self.insert(Buyer, (
+            Buyer(
+                id=i, full_name=f'Buyer {i}', contact_person=f'Contact {i}',
+                phone_number=rng.choice(phones), email=f'buyer{i}@example.com'
+            )
+            for i in range(start, start + count)
+        ))
+
+    def _documents(self, name, model, item_model, owner_field, owner_model,
+                   statuses, count, items_per_document):
+        """Документы (заказы или поставки) и их позиции"""
+        rng = self.rng(name)
+        owner_ids = self.required_ids(owner_model, count, model)
+        product_ids = self.required_ids(Product, count, model)
+        start = next_id(model)
+        item_start = next_id(item_model)
+        parent_field = model._meta.model_name
+        with disable_auto_now_add(model):
+            self.insert(model, (
+                model(id=i, status=rng.choice(statuses), created_at=self.created_at(rng),
+                      **{f'{owner_field}_id': rng.choice(owner_ids)})
+                for i in range(start, start + count)
+            ))
+
+        def items():
+            item_id = item_start
+            for document_id in range(start, start + count):
+                for _ in range(rng.randint(1, 2 * items_per_document - 1)):
+                    yield item_model(
+                        id=item_id, product_id=rng.choice(product_ids),
+                        quantity=rng.randint(1, 20),
+                        **{f'{parent_field}_id': document_id}
+                    )
+                    item_id += 1
+
+        self.insert(item_model, items())
+
+    def orders(self, count, items_per_order):
+        self._documents('orders', Order, OrderItem, 'buyer', Buyer,
+                        ('active', 'fulfilled'), count, items_per_order)
+
+    def deliveries(self, count, items_per_delivery):
+        self._documents('deliveries', Delivery, DeliveryItem, 'supplier', Supplier,
+                        ('active',), count, items_per_delivery)
+
+    def reset_sequences(self):
+        """Сдвигает последовательности id после вставки с явными id"""
+        models = [User, Category, Product, PriceHistory, Supplier,
+                  Supplier.product_category.through, Buyer, Order, OrderItem,
+                  Delivery, DeliveryItem]
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
@@ -1,8 +1,14 @@
 from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
 from django.contrib.auth import password_validation, get_user_model
+from django.db import transaction
 from rest_framework.generics import get_object_or_404
 from .models import (Delivery, Product, Category, Supplier, DeliveryItem,
-                     OrderItem, Order, Buyer)
+                     OrderItem, Order, Buyer, StockAlert,
+                     ReplenishmentSuggestion, Warehouse, WarehouseStock,
+                     ArchivedOrder, ArchivedOrderItem, ArchivedDelivery,
+                     ArchivedDeliveryItem, DeletionJob, StockAuditEvent)
+from .stock import receive_delivery, allocate_order, register_initial_stock
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -30,12 +36,19 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ('username', 'email', 'password')
 
 
+# Имя категории уникально среди неудаленных категорий
+CATEGORY_NAME_KWARGS = {
+    'validators': [UniqueValidator(queryset=Category.objects.filter(is_deleted=False))],
+}
+
+
 class CategoryCreateSerializer(serializers.ModelSerializer):
     """Сериализатор для создания категории"""
 
     class Meta:
         model = Category
         fields = ('name',)
+        extra_kwargs = {'name': CATEGORY_NAME_KWARGS}
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -52,7 +65,7 @@ class CategorySerializer(serializers.ModelSerializer):
             'total_items',
             'total_value'
         )
-
+        extra_kwargs = {'name': CATEGORY_NAME_KWARGS}
 
     def get_number_of_products(self, obj):
         return obj.number_of_products
@@ -65,11 +78,48 @@ class CategorySerializer(serializers.ModelSerializer):
 
 
 class ProductSerializer(serializers.ModelSerializer):
-    """Сериализатор для товаров"""
+    """
+    Сериализатор для товаров. Остаток задается при создании товара,
+    дальше он меняется поставками, заказами и корректировками
+    (POST /api/products/{id}/adjust-stock/) вместе с остатками на складах
+    (api_v1.stock)
+    """
 
     class Meta:
         model = Product
         fields = ('__all__')
+        extra_kwargs = {
+            'category': {'queryset': Category.objects.filter(is_deleted=False)},
+        }
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            product = super().create(validated_data)
+            register_initial_stock(
+                product, getattr(self.context.get('request'), 'user', None)
+            )
+        return product
+
+    def validate_quantity(self, value):
+        if self.instance is not None and value != self.instance.quantity:
+            raise serializers.ValidationError(
+                'Stock cannot be set directly, '
+                'use POST /api/products/{id}/adjust-stock/'
+            )
+        return value
+
+
+class StockAdjustmentSerializer(serializers.Serializer):
+    """Корректировка остатка товара на delta единиц"""
+    delta = serializers.IntegerField()
+    warehouse = serializers.PrimaryKeyRelatedField(
+        queryset=Warehouse.objects.all(), required=False, allow_null=True
+    )
+
+    def validate_delta(self, value):
+        if not value:
+            raise serializers.ValidationError('Delta must not be zero')
+        return value
 
 
 class SupplierSerializer(serializers.ModelSerializer):
@@ -78,6 +128,7 @@ class SupplierSerializer(serializers.ModelSerializer):
     class Meta:
         model = Supplier
         fields = ('__all__')
+        read_only_fields = ('is_deleted',)
 
 
 class BuyerSerializer(serializers.ModelSerializer):
@@ -107,16 +158,15 @@ class DeliverySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Delivery
-        fields = ('supplier', 'items')
+        fields = ('supplier', 'warehouse', 'items')
 
     def create(self, validated_data):
         items_data = validated_data.pop('items')
-        delivery = Delivery.objects.create(**validated_data)
-        for item_data in items_data:
-            DeliveryItem.objects.create(delivery=delivery, **item_data)
-            product = item_data['product']
-            product.quantity += item_data['quantity']
-            product.save()
+        with transaction.atomic():
+            delivery = Delivery.objects.create(**validated_data)
+            receive_delivery(
+                delivery, items_data, getattr(self.context.get('request'), 'user', None)
+            )
         return delivery
 
 
@@ -130,21 +180,37 @@ class DeliveryListSerializer(serializers.ModelSerializer):
         fields = ('id', 'created_at')
 
 
+class CategoryNameSerializer(serializers.ModelSerializer):
+    """Категория в карточке поставщика"""
+
+    class Meta:
+        model = Category
+        fields = ('id', 'name')
+
+
 class SupplierDetailSerializer(serializers.ModelSerializer):
     """Сериализатор для отдельного поставщика"""
 
     deliveries = DeliveryListSerializer(many=True)
+    product_category = CategoryNameSerializer(many=True, read_only=True)
 
     class Meta:
         model = Supplier
         fields = ('__all__')
+        read_only_fields = ('is_deleted',)
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
     """Вспомогательный сериализатор для количества товаров в заказе"""
+    # Товары удаленных категорий не заказываются
+    product = serializers.PrimaryKeyRelatedField(
+        queryset=Product.objects.filter(category__is_deleted=False)
+    )
+
     class Meta:
         model = OrderItem
-        fields = ('product', 'quantity')
+        fields = ('product', 'warehouse', 'quantity')
+        read_only_fields = ('warehouse',)
 
     def validate_quantity(self, value):
         if value <= 0:
@@ -165,21 +231,71 @@ class OrderItemSerializer(serializers.ModelSerializer):
 
 
 class OrderSerializer(serializers.ModelSerializer):
-    """Сериализатор заказа"""
+    """
+    Сериализатор заказа. Заказ можно создать черновиком: товар под него
+    списывается сразу, а если черновик не подтвердить, он отменяется
+    командой expire_drafts и товар возвращается на остатки
+    """
     items = OrderItemSerializer(many=True)
+    status = serializers.ChoiceField(
+        choices=(('active', 'Active'), ('draft', 'Draft')),
+        default='active'
+    )
+
+    # Разрешенные смены статуса после создания заказа
+    STATUS_TRANSITIONS = {'draft': ('active',)}
 
     class Meta:
         model = Order
-        fields = ('buyer', 'items')
+        fields = ('buyer', 'warehouse', 'status', 'items')
+
+    def validate_status(self, value):
+        if self.instance is None or value == self.instance.status:
+            return value
+        if value not in self.STATUS_TRANSITIONS.get(self.instance.status, ()):
+            raise serializers.ValidationError(
+                f'Cannot change status from {self.instance.status} to {value}'
+            )
+        return value
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.instance is not None:
+            # Позиции задаются только при создании, PUT обходится без них
+            fields['items'].required = False
+        return fields
+
+    def validate(self, data):
+        if self.instance is not None and 'items' in data:
+            raise serializers.ValidationError(
+                {'items': 'Order items cannot be changed after creation'}
+            )
+        return data
+
+    def update(self, instance, validated_data):
+        status = validated_data.pop('status', instance.status)
+        with transaction.atomic():
+            if status != instance.status:
+                # Статус меняется условным UPDATE, чтобы не подтвердить
+                # черновик, который expire_drafts уже отменил
+                updated = Order.objects.filter(
+                    pk=instance.pk, status=instance.status
+                ).update(status=status)
+                if not updated:
+                    raise serializers.ValidationError(
+                        {'status': 'Order status has been changed, reload the order'}
+                    )
+                instance.status = status
+            return super().update(instance, validated_data)
 
     def create(self, validated_data):
         items_validated_data = validated_data.pop('items')
-        order = Order.objects.create(**validated_data)
-        for item_data in items_validated_data:
-            OrderItem.objects.create(order=order, **item_data)
-            product = item_data['product']
-            product.quantity -= item_data['quantity']
-            product.save()
+        with transaction.atomic():
+            order = Order.objects.create(**validated_data)
+            allocate_order(
+                order, items_validated_data,
+                getattr(self.context.get('request'), 'user', None)
+            )
         return order
 
 
@@ -190,3 +306,85 @@ class BuyerDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = Buyer
         fields = ('__all__')
+
+
+class StockAlertSerializer(serializers.ModelSerializer):
+    """Сериализатор уведомлений о низком остатке"""
+
+    class Meta:
+        model = StockAlert
+        fields = ('__all__')
+
+
+class ReplenishmentSuggestionSerializer(serializers.ModelSerializer):
+    """Сериализатор рекомендаций по дозаказу"""
+
+    class Meta:
+        model = ReplenishmentSuggestion
+        fields = ('__all__')
+
+
+class WarehouseSerializer(serializers.ModelSerializer):
+    """Сериализатор складов"""
+
+    class Meta:
+        model = Warehouse
+        fields = ('__all__')
+
+
+class WarehouseStockSerializer(serializers.ModelSerializer):
+    """Сериализатор остатков товаров на складе"""
+
+    class Meta:
+        model = WarehouseStock
+        fields = ('product', 'quantity')
+
+
+class ArchivedOrderItemSerializer(serializers.ModelSerializer):
+    """Сериализатор товаров архивного заказа"""
+
+    class Meta:
+        model = ArchivedOrderItem
+        fields = ('product', 'warehouse', 'quantity')
+
+
+class ArchivedOrderSerializer(serializers.ModelSerializer):
+    """Сериализатор архивного заказа, совпадает по полям с OrderSerializer"""
+    items = ArchivedOrderItemSerializer(many=True)
+
+    class Meta:
+        model = ArchivedOrder
+        fields = ('buyer', 'warehouse', 'status', 'items')
+
+
+class ArchivedDeliveryItemSerializer(serializers.ModelSerializer):
+    """Сериализатор товаров архивной поставки"""
+
+    class Meta:
+        model = ArchivedDeliveryItem
+        fields = ('product', 'quantity')
+
+
+class ArchivedDeliverySerializer(serializers.ModelSerializer):
+    """Сериализатор архивной поставки, совпадает по полям с DeliverySerializer"""
+    items = ArchivedDeliveryItemSerializer(many=True)
+
+    class Meta:
+        model = ArchivedDelivery
+        fields = ('supplier', 'warehouse', 'items')
+
+
+class DeletionJobSerializer(serializers.ModelSerializer):
+    """Сериализатор задачи пакетного удаления"""
+
+    class Meta:
+        model = DeletionJob
+        fields = ('__all__')
+
+
+class StockAuditEventSerializer(serializers.ModelSerializer):
+    """Сериализатор события журнала аудита остатков"""
+
+    class Meta:
+        model = StockAuditEvent
+        fields = ('__all__')
@@ -0,0 +1,84 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+from .models import (Category, Product, PriceHistory, StockChange,
+                     StockAuditEvent, Supplier)
+from .alerts import evaluate_reorder_points
+from .suppliers import supplier_index
+from . import audit
+
+
+# Отправляется после изменения остатков товаров.
+# changes - список пар (product, delta), где product уже содержит
+# новое значение quantity, instance - заказ, поставка или товар (создание
+# и ручная корректировка остатка), None для
+# пакетных операций над несколькими заказами, user - автор изменения
+# или None для системных операций
+stock_changed = Signal(providing_args=['instance', 'changes', 'user'])
+
+
+@receiver(stock_changed)
+def record_stock_changes(sender, changes, **kwargs):
+    """
+    Записывает новые остатки в ленту изменений одним запросом после
+    фиксации транзакции. Курсор ленты - id записи, поэтому записи
+    вставляются короткими отдельными транзакциями: иначе долгая транзакция
+    могла бы зафиксировать меньший id позже, чем лента прочла больший
+    """
+    rows = [
+        StockChange(product=product, quantity=product.quantity)
+        for product, delta in changes
+    ]
+    transaction.on_commit(lambda: StockChange.objects.bulk_create(rows))
+
+
+@receiver(stock_changed)
+def check_reorder_points(sender, changes, **kwargs):
+    """Проверяет точки заказа у товаров, затронутых заказом или поставкой"""
+    evaluate_reorder_points({product.id for product, delta in changes})
+
+
+@receiver(stock_changed)
+def audit_stock_changes(sender, instance, changes, user=None, **kwargs):
+    """Записывает изменения в журнал аудита после фиксации транзакции"""
+    source = sender._meta.model_name
+    object_id = instance.pk if instance is not None and source != 'product' else None
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    audit.record([
+        StockAuditEvent(
+            product_id=product.id,
+            user_id=user_id,
+            delta=delta,
+            quantity=product.quantity,
+            source=source,
+            object_id=object_id
+        )
+        for product, delta in changes
+        if delta
+    ])
+
+
+@receiver(post_save, sender=Product)
+def record_price_change(sender, instance, created, update_fields=None, **kwargs):
+    """Добавляет запись в историю цен, если цена товара изменилась"""
+    if update_fields is not None and 'price' not in update_fields:
+        return
+    if not created:
+        last_price = instance.price_history.order_by(
+            '-valid_from'
+        ).values_list('price', flat=True).first()
+        if last_price == instance.price:
+            return
+    PriceHistory.objects.create(
+        product=instance, price=instance.price, valid_from=timezone.now()
+    )
+
+
+@receiver(m2m_changed, sender=Supplier.product_category.through)
+@receiver([post_save, post_delete], sender=Supplier)
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_supplier_index(sender, action='post_', **kwargs):
+    """Сбрасывает индекс поставщиков по категориям после изменения связей"""
+    if action.startswith('post_'):
+        supplier_index.invalidate()
@@ -0,0 +1,271 @@
+"""
+Изменение остатков товаров при поставках и заказах.
+
+Product.quantity хранит общий остаток и обновляется вместе с остатками
+по складам (WarehouseStock) в той же транзакции, поэтому сериализаторы
+товаров и статистика категорий читают его без агрегации по складам.
+Остаток, не привязанный ни к одному складу, равен разнице между
+Product.quantity и суммой остатков по складам.
+"""
+import math
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Sum
+from rest_framework import serializers
+from .models import (Order, Product, Warehouse, WarehouseStock, DeliveryItem,
+                     OrderItem)
+from .signals import stock_changed
+
+
+def _distance(a, b):
+    """Расстояние между складами по дуге большого круга в километрах"""
+    lat1, lon1, lat2, lon2 = map(
+        math.radians, (a.latitude, a.longitude, b.latitude, b.longitude)
+    )
+    h = (math.sin((lat2 - lat1) / 2) ** 2 +
+         math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 12742 * math.asin(math.sqrt(h))
+
+
+def rank_warehouses(origin):
+    """
+    Возвращает id складов по возрастанию расстояния от склада origin.
+    Без origin склады идут в порядке id
+    """
+    warehouses = list(Warehouse.objects.order_by('id'))
+    if origin is not None:
+        warehouses.sort(key=lambda warehouse: _distance(origin, warehouse))
+    return [warehouse.id for warehouse in warehouses]
+
+
+def _quantities(items_data):
+    quantities = defaultdict(int)
+    for item_data in items_data:
+        quantities[item_data['product'].id] += item_data['quantity']
+    return quantities
+
+
+def _lock_products(quantities):
+    """
+    Блокирует товары позиций. Товар мог быть удален после проверки
+    сериализатором, например фоновым удалением категории
+    """
+    products = Product.objects.select_for_update().in_bulk(quantities)
+    missing = sorted(set(quantities) - set(products))
+    if missing:
+        raise serializers.ValidationError(
+            f'Products {", ".join(map(str, missing))} no longer exist'
+        )
+    return products
+
+
+def _save_products(products, quantities, sign):
+    for product_id, quantity in quantities.items():
+        products[product_id].quantity += sign * quantity
+    Product.objects.bulk_update(products.values(), ('quantity',))
+    return [
+        (products[product_id], sign * quantity)
+        for product_id, quantity in quantities.items()
+    ]
+
+
+def receive_delivery(delivery, items_data, user=None):
+    """
+    Создает позиции поставки и пополняет общий остаток и остаток
+    на складе поставки
+    """
+    quantities = _quantities(items_data)
+    with transaction.atomic():
+        products = _lock_products(quantities)
+        DeliveryItem.objects.bulk_create(
+            DeliveryItem(delivery=delivery, **item_data) for item_data in items_data
+        )
+        if delivery.warehouse_id is not None:
+            stock = {
+                row.product_id: row
+                for row in WarehouseStock.objects.select_for_update().filter(
+                    warehouse_id=delivery.warehouse_id, product_id__in=quantities
+                )
+            }
+            for product_id, quantity in quantities.items():
+                if product_id in stock:
+                    stock[product_id].quantity += quantity
+            WarehouseStock.objects.bulk_update(stock.values(), ('quantity',))
+            WarehouseStock.objects.bulk_create(
+                WarehouseStock(
+                    warehouse_id=delivery.warehouse_id,
+                    product_id=product_id,
+                    quantity=quantity
+                )
+                for product_id, quantity in quantities.items()
+                if product_id not in stock
+            )
+        changes = _save_products(products, quantities, 1)
+        stock_changed.send(sender=type(delivery), instance=delivery,
+                           changes=changes, user=user)
+    return delivery
+
+
+def _allocate_line(product_id, quantity, ranking, stock):
+    """
+    Делит позицию заказа между складами: целиком с ближайшего склада,
+    где хватает товара, иначе по очереди с ближайших складов. Остаток
+    позиции берется из товара, не привязанного к складу
+    """
+    rows = stock.get(product_id, {})
+    for warehouse_id in ranking:
+        row = rows.get(warehouse_id)
+        if row is not None and row.quantity >= quantity:
+            row.quantity -= quantity
+            return [(warehouse_id, quantity)]
+    allocation = []
+    for warehouse_id in ranking:
+        row = rows.get(warehouse_id)
+        if row is None or not row.quantity:
+            continue
+        taken = min(row.quantity, quantity)
+        row.quantity -= taken
+        quantity -= taken
+        allocation.append((warehouse_id, taken))
+        if not quantity:
+            return allocation
+    allocation.append((None, quantity))
+    return allocation
+
+
+def allocate_order(order, items_data, user=None):
+    """
+    Создает позиции заказа, распределенные по складам, за один проход:
+    блокирует товары и остатки на складах, проверяет общий остаток,
+    распределяет позиции и сохраняет изменения пакетно
+    """
+    quantities = _quantities(items_data)
+    with transaction.atomic():
+        products = _lock_products(quantities)
+        for product_id, quantity in quantities.items():
+            product = products[product_id]
+            if product.quantity < quantity:
+                raise serializers.ValidationError(
+                    f'Not enough items of {product}, '
+                    f'available only {product.quantity} items, '
+                    f'requested {quantity} items'
+                )
+
+        stock = defaultdict(dict)
+        for row in WarehouseStock.objects.select_for_update().filter(
+                product_id__in=quantities, quantity__gt=0):
+            stock[row.product_id][row.warehouse_id] = row
+        ranking = rank_warehouses(order.warehouse) if stock else []
+
+        items = []
+        for item_data in items_data:
+            product = item_data['product']
+            for warehouse_id, quantity in _allocate_line(
+                    product.id, item_data['quantity'], ranking, stock):
+                items.append(OrderItem(
+                    order=order,
+                    product=product,
+                    warehouse_id=warehouse_id,
+                    quantity=quantity
+                ))
+        OrderItem.objects.bulk_create(items)
+        WarehouseStock.objects.bulk_update(
+            [row for rows in stock.values() for row in rows.values()],
+            ('quantity',)
+        )
+        changes = _save_products(products, quantities, -1)
+        stock_changed.send(sender=type(order), instance=order,
+                           changes=changes, user=user)
+    return order
+
+
+def register_initial_stock(product, user=None):
+    """
+    Записывает начальный остаток нового товара в ленту изменений и
+    журнал аудита. Вызывается в транзакции создания товара
+    """
+    if product.quantity:
+        stock_changed.send(sender=Product, instance=product,
+                           changes=[(product, product.quantity)], user=user)
+
+
+def adjust_stock(product, delta, warehouse=None, user=None):
+    """
+    Ручная корректировка остатка товара (инвентаризация, списание брака)
+    на delta единиц: на складе warehouse или в остатке без склада.
+    Общий остаток меняется вместе с остатком на складе, изменение
+    попадает в ленту изменений и журнал аудита
+    """
+    with transaction.atomic():
+        product = _lock_products({product.id: delta})[product.id]
+        if warehouse is not None:
+            row, created = WarehouseStock.objects.select_for_update().get_or_create(
+                warehouse=warehouse, product=product, defaults={'quantity': 0}
+            )
+            available = row.quantity
+        else:
+            row = None
+            assigned = WarehouseStock.objects.filter(product=product).aggregate(
+                total=Sum('quantity'))['total'] or 0
+            available = product.quantity - assigned
+        if available + delta < 0:
+            raise serializers.ValidationError(
+                {'delta': f'Not enough items of {product}, available only {available} items'}
+            )
+        if row is not None:
+            row.quantity += delta
+            row.save(update_fields=('quantity',))
+        changes = _save_products({product.id: product}, {product.id: delta}, 1)
+        stock_changed.send(sender=Product, instance=product,
+                           changes=changes, user=user)
+    return product
+
+
+def _add_grouped(queryset, key, totals):
+    """
+    Прибавляет к quantity строк queryset суммы totals {ключ: сумма}.
+    Строки с одинаковой суммой обновляются одним UPDATE с F()
+    """
+    by_total = defaultdict(list)
+    for row_key, total in totals.items():
+        by_total[total].append(row_key)
+    for total, keys in by_total.items():
+        queryset.filter(**{f'{key}__in': keys}).update(quantity=F('quantity') + total)
+
+
+def release_orders(order_ids):
+    """
+    Возвращает на общие остатки и остатки складов товар, списанный
+    заказами order_ids. Позиции суммируются по товарам и складам, остатки
+    обновляются через F() без загрузки заказов и товаров
+    """
+    items = OrderItem.objects.filter(order_id__in=order_ids)
+    with transaction.atomic():
+        product_totals = dict(
+            items.values('product_id').annotate(total=Sum('quantity'))
+            .values_list('product_id', 'total').order_by()
+        )
+        if not product_totals:
+            return []
+        _add_grouped(Product.objects.all(), 'id', product_totals)
+
+        warehouse_totals = defaultdict(dict)
+        for warehouse_id, product_id, total in (
+                items.filter(warehouse__isnull=False)
+                .values('warehouse_id', 'product_id').annotate(total=Sum('quantity'))
+                .values_list('warehouse_id', 'product_id', 'total').order_by()):
+            warehouse_totals[warehouse_id][product_id] = total
+        for warehouse_id, totals in warehouse_totals.items():
+            _add_grouped(
+                WarehouseStock.objects.filter(warehouse_id=warehouse_id),
+                'product_id', totals
+            )
+
+        products = Product.objects.in_bulk(product_totals)
+        changes = [
+            (products[product_id], total)
+            for product_id, total in product_totals.items()
+        ]
+        stock_changed.send(sender=Order, instance=None, changes=changes)
+    return changes
@@ -0,0 +1,245 @@
+import asyncio
+import json
+from collections import deque
+
+from django.conf import settings
+from django.db.models import Max
+from .models import StockChange
+from .async_views import json_response, query_params, run_query, scope_compressor
+
+
+def _fetch_changes(since, limit, until=None):
+    changes = StockChange.objects.filter(id__gt=since)
+    if until is not None:
+        changes = changes.filter(id__lte=until)
+    return [
+        {
+            'id': change['id'],
+            'product': change['product_id'],
+            'quantity': change['quantity'],
+            'created_at': change['created_at'].isoformat(),
+        }
+        for change in changes.order_by('id').values(
+            'id', 'product_id', 'quantity', 'created_at')[:limit]
+    ]
+
+
+def _fetch_last_id():
+    return StockChange.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+
+
+class StockChangeFeed:
+    """
+    Лента изменений остатков для одного процесса.
+
+    Один фоновый опрос базы на процесс, пока есть подписчики. Новые записи
+    складываются в кольцевой буфер, ожидающие подписчики будятся событием
+    и читают изменения из памяти. В базу напрямую ходят только подписчики
+    с курсором, который старше буфера.
+
+    Записи с меньшим id могут стать видимы позже записей с большим id,
+    поэтому лента публикует записи только до первого пропуска в id.
+    Пропуск, который не заполнился за gap_timeout секунд, считается
+    откаченной вставкой и пропускается.
+    """
+
+    def __init__(self, poll_interval=1.0, buffer_size=1000, gap_timeout=5.0):
+        self.poll_interval = poll_interval
+        self.buffer_size = buffer_size
+        self.gap_timeout = gap_timeout
+        self._gap_since = None
+        self._buffer = deque(maxlen=buffer_size)
+        self._floor = None
+        self._last_id = None
+        self._changed = None
+        self._started = None
+        self._listeners = 0
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    async def changes_since(self, since, timeout):
+        """
+        Возвращает изменения с id больше since. Если изменений нет,
+        ждет их не дольше timeout секунд и возвращает пустой список.
+        """
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        self._listeners += 1
+        try:
+            await self._start()
+            if since is None:
+                since = self._last_id
+            while True:
+                changes = await self._read(since)
+                if changes:
+                    return changes
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return []
+                try:
+                    await asyncio.wait_for(self._changed.wait(), remaining)
+                except asyncio.TimeoutError:
+                    return []
+        finally:
+            self._listeners -= 1
+
+    async def _start(self):
+        if self._started is None:
+            self._started = asyncio.ensure_future(self._prime())
+        await asyncio.shield(self._started)
+
+    async def _prime(self):
+        self._changed = asyncio.Event()
+        self._last_id = await run_query(_fetch_last_id)
+        self._floor = self._last_id
+        self._buffer.clear()
+        asyncio.ensure_future(self._poll())
+
+    async def _read(self, since):
+        if since >= self._last_id:
+            return []
+        if since >= self._floor:
+            return [change for change in self._buffer if change['id'] > since]
+        return await run_query(_fetch_changes, since, self.buffer_size, self._last_id)
+
+    def _contiguous(self, changes, now):
+        """Начало changes без пропусков в id после уже опубликованных записей"""
+        published = []
+        expected = self._last_id + 1
+        for change in changes:
+            if change['id'] != expected:
+                if self._gap_since is None:
+                    self._gap_since = now
+                if now - self._gap_since < self.gap_timeout:
+                    break
+            self._gap_since = None
+            published.append(change)
+            expected = change['id'] + 1
+        return published
+
+    async def _poll(self):
+        try:
+            while self._listeners > 0:
+                await asyncio.sleep(self.poll_interval)
+                changes = self._contiguous(
+                    await run_query(_fetch_changes, self._last_id, self.buffer_size),
+                    asyncio.get_event_loop().time()
+                )
+                if not changes:
+                    continue
+                for change in changes:
+                    if len(self._buffer) == self.buffer_size:
+                        self._floor = self._buffer[0]['id']
+                    self._buffer.append(change)
+                self._last_id = changes[-1]['id']
+                changed, self._changed = self._changed, asyncio.Event()
+                changed.set()
+        finally:
+            self._started = None
+
+
+feed = StockChangeFeed(
+    poll_interval=getattr(settings, 'STOCK_FEED_POLL_INTERVAL', 1.0),
+    buffer_size=getattr(settings, 'STOCK_FEED_BUFFER_SIZE', 1000),
+    gap_timeout=getattr(settings, 'STOCK_FEED_GAP_TIMEOUT', 5.0),
+)
+
+
+def _get_cursor(value):
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+async def _long_poll(send, since, timeout, compressor):
+    changes = await feed.changes_since(since, timeout)
+    if changes:
+        cursor = changes[-1]['id']
+    else:
+        cursor = since if since is not None else feed.last_id
+    await json_response(send, 200, {'cursor': cursor, 'changes': changes}, compressor)
+
+
+async def _event_stream(receive, send, since, keepalive, compressor):
+    headers = [
+        (b'content-type', b'text/event-stream'),
+        (b'cache-control', b'no-cache'),
+        (b'x-accel-buffering', b'no'),
+    ]
+    if compressor is not None:
+        headers += [
+            (b'content-encoding', compressor.encoding.encode()),
+            (b'vary', b'Accept-Encoding'),
+        ]
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': headers,
+    })
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        while True:
+            waiting = asyncio.ensure_future(feed.changes_since(since, keepalive))
+            await asyncio.wait(
+                (waiting, disconnected), return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnected.done():
+                waiting.cancel()
+                return
+            changes = waiting.result()
+            if not changes:
+                if since is None:
+                    since = feed.last_id
+                chunk = b': keepalive\n\n'
+            else:
+                since = changes[-1]['id']
+                chunk = b''.join(
+                    f'id: {change["id"]}\nevent: stock\n'
+                    f'data: {json.dumps(change)}\n\n'.encode()
+                    for change in changes
+                )
+            if compressor is not None:
+                # Каждое событие сбрасывается из компрессора сразу
+                chunk = compressor.compress(chunk) + compressor.flush()
+            await send({
+                'type': 'http.response.body',
+                'body': chunk,
+                'more_body': True,
+            })
+    finally:
+        disconnected.cancel()
+
+
+async def _wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def stock_changes(scope, receive, send):
+    """
+    ASGI-обработчик ленты изменений остатков товаров.
+
+    С заголовком Accept: text/event-stream отдает server-sent events,
+    иначе работает как long-poll: возвращает изменения после курсора since
+    или ждет их не дольше timeout секунд. Ответы сжимаются по
+    Accept-Encoding, события потока - по одному по мере отправки.
+    """
+    headers = dict(scope['headers'])
+    params = query_params(scope)
+    since = _get_cursor(params.get('since'))
+    if since is None:
+        since = _get_cursor(headers.get(b'last-event-id', b'').decode() or None)
+    max_timeout = getattr(settings, 'STOCK_FEED_MAX_TIMEOUT', 30)
+    timeout = _get_cursor(params.get('timeout'))
+    timeout = min(timeout if timeout is not None else max_timeout, max_timeout)
+
+    compressor = scope_compressor(scope)
+    if b'text/event-stream' in headers.get(b'accept', b''):
+        await _event_stream(receive, send, since, max_timeout, compressor)
+    else:
+        await _long_poll(send, since, timeout, compressor)
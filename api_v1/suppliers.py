@@ -0,0 +1,74 @@
+"""
+Поиск поставщиков, которые могут привезти товары.
+
+Связь "категория -> поставщики" из Supplier.product_category хранится
+в памяти процесса и строится одним запросом при первом обращении.
+Изменение связей, поставщиков или категорий сбрасывает индекс: версия
+индекса хранится в кэше, поэтому сброс видят все процессы, если кэш
+общий (CACHES в настройках); с локальным кэшем процесса другие процессы
+продолжат пользоваться старым индексом.
+"""
+import threading
+import uuid
+from collections import defaultdict
+
+from django.core.cache import cache
+from .models import Product, Supplier
+
+VERSION_KEY = 'supplier_index_version'
+
+
+class SupplierIndex:
+    """Поставщики категорий: {category_id: ((supplier_id, name), ...)} по возрастанию id"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._map = None
+        self._version = None
+
+    def _build(self):
+        index = defaultdict(list)
+        for category_id, supplier_id, name in (
+                Supplier.product_category.through.objects
+                .filter(supplier__is_deleted=False, category__is_deleted=False)
+                .order_by('supplier_id')
+                .values_list('category_id', 'supplier_id', 'supplier__name')):
+            index[category_id].append((supplier_id, name))
+        return {category_id: tuple(suppliers) for category_id, suppliers in index.items()}
+
+    def get(self):
+        version = cache.get(VERSION_KEY)
+        with self._lock:
+            if self._map is not None and self._version == version:
+                return self._map
+        if version is None:
+            version = uuid.uuid4().hex
+            cache.add(VERSION_KEY, version, None)
+            version = cache.get(VERSION_KEY, version)
+        index = self._build()
+        with self._lock:
+            self._map, self._version = index, version
+        return index
+
+    def invalidate(self):
+        cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+        with self._lock:
+            self._map = None
+
+
+supplier_index = SupplierIndex()
+
+
+def suppliers_for(product_ids):
+    """
+    Поставщики для каждого товара: {product_id: ((supplier_id, name), ...)}.
+    Одним запросом определяются категории товаров, остальное берется
+    из индекса. Неизвестные товары в результат не попадают
+    """
+    index = supplier_index.get()
+    return {
+        product_id: index.get(category_id, ())
+        for product_id, category_id in
+        Product.objects.filter(id__in=product_ids).values_list('id', 'category_id')
+    }
+
@@ -1,3 +1,1189 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import tempfile
+import zlib
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from itertools import count
+from unittest import mock, skipIf
+from urllib.parse import urlencode, urlsplit
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.contrib.admin import site as admin_site
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.core.paginator import Paginator
+from django.db import IntegrityError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from . import admin as admin_module, audit, forecasting, streams, throttling, yasg
+from .admin import DeliveryAdmin, EstimatedCountPaginator
+from .alerts import evaluate_reorder_points
+from .archive import order_archiver
+from .deletion import claim_job, run_job
+from .drafts import expire_drafts
+from .models import (ArchivedDelivery, ArchivedDeliveryItem, ArchivedOrder,
+                     ArchivedOrderItem, Buyer, Category, DeletionJob, Delivery,
+                     DeliveryItem, Order, OrderItem, PriceHistory, Product,
+                     StockAlert, StockAuditEvent, StockChange, Supplier, User,
+                     Warehouse, WarehouseStock)
+from .pricing import price_at, with_prices
+from .stock import allocate_order
+from .streams import StockChangeFeed
+from .suppliers import SupplierIndex
+from .throttling import BucketRegistry, DatabaseLatency, TokenBucketThrottle
+from .yasg import write_schema
+from stms_v1 import middleware
+from stms_v1.middleware import CompressionMiddleware
+
+product_numbers = count(1)
+
+
+def create_product(quantity=10, **kwargs):
+    category = kwargs.pop('category', None) or Category.objects.get_or_create(name='Category')[0]
+    number = next(product_numbers)
+    return Product.objects.create(
+        name=kwargs.pop('name', f'Product {number}'), category=category,
+        sku=kwargs.pop('sku', f'SKU-{number}'),
+        quantity=quantity, price=kwargs.pop('price', 100), **kwargs
+    )
+
+
+def create_supplier(*categories, name='Supplier'):
+    supplier = Supplier.objects.create(
+        name=name, address='Address', bank_details='0' * 20,
+        contact_person='Contact', phone_number='+74951234567',
+        email='supplier@example.com'
+    )
+    supplier.product_category.set(categories)
+    return supplier
+
+
+def create_buyer():
+    return Buyer.objects.create(
+        full_name='Buyer', contact_person='Contact',
+        phone_number='+74951234567', email='buyer@example.com'
+    )
+
+
+def asgi_get(path, host=b'127.0.0.1', headers=(), query_string=b''):
+    """GET-запрос через ASGI-приложение stms_v1.asgi: (статус, заголовки, тело)"""
+    from stms_v1.asgi import application
+    scope = {
+        'type': 'http', 'method': 'GET', 'path': path, 'query_string': query_string,
+        'root_path': '', 'scheme': 'http', 'server': ('127.0.0.1', 80),
+        'headers': [(b'host', host), *headers],
+    }
+
+    async def request():
+        communicator = ApplicationCommunicator(application, scope)
+        await communicator.send_input({'type': 'http.request', 'body': b''})
+        start = await communicator.receive_output(5)
+        body = b''
+        while True:
+            message = await communicator.receive_output(5)
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        headers = {name.lower(): value for name, value in start['headers']}
+        return start['status'], headers, body
+
+    return async_to_sync(request)()
+
+
+class OrderStatusTests(APITestCase):
+
+    def setUp(self):
+        self.product = create_product(quantity=10)
+        self.buyer = create_buyer()
+
+    def create_order(self, status='active', quantity=4):
+        response = self.client.post('/api/orders/', {
+            'buyer': self.buyer.id,
+            'status': status,
+            'items': [{'product': self.product.id, 'quantity': quantity}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return Order.objects.latest('id')
+
+    def set_status(self, order, status):
+        return self.client.patch(f'/api/orders/{order.id}/', {'status': status},
+                                 format='json')
+
+    def test_draft_can_be_confirmed(self):
+        order = self.create_order(status='draft')
+        response = self.set_status(order, 'active')
+        self.assertEqual(response.status_code, 200, response.data)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'active')
+
+    def test_fulfilled_order_cannot_become_draft(self):
+        order = self.create_order()
+        Order.objects.filter(id=order.id).update(status='fulfilled')
+        self.assertEqual(self.set_status(order, 'draft').status_code, 400)
+        expire_drafts(order_hours=0)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 6)
+
+    def test_put_confirms_draft_without_items(self):
+        order = self.create_order(status='draft')
+        response = self.client.put(f'/api/orders/{order.id}/', {
+            'buyer': self.buyer.id, 'status': 'active',
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'active')
+
+    def test_put_with_items_is_rejected_before_any_write(self):
+        order = self.create_order(status='draft')
+        response = self.client.put(f'/api/orders/{order.id}/', {
+            'buyer': self.buyer.id, 'status': 'active',
+            'items': [{'product': self.product.id, 'quantity': 1}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('items', response.data)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'draft')
+
+    def test_cancelled_order_cannot_be_reactivated(self):
+        order = self.create_order()
+        Order.objects.filter(id=order.id).update(status='cancelled')
+        self.assertEqual(self.set_status(order, 'active').status_code, 400)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'cancelled')
+
+    def test_active_order_cannot_become_draft(self):
+        order = self.create_order()
+        self.assertEqual(self.set_status(order, 'draft').status_code, 400)
+
+
+class StockAlertTests(TestCase):
+
+    def setUp(self):
+        self.first, self.second = (Category.objects.create(name=name)
+                                   for name in ('First', 'Second'))
+        self.first_supplier = create_supplier(self.first, name='First supplier')
+        self.second_supplier = create_supplier(self.second, name='Second supplier')
+        self.products = [
+            create_product(quantity=2, reorder_point=5, category=category)
+            for category in (self.first, self.first, self.second)
+        ]
+        self.ids = [product.id for product in self.products]
+
+    def drafts(self):
+        return {
+            delivery.supplier_id: sorted(item.product_id for item in delivery.items.all())
+            for delivery in Delivery.objects.filter(status='draft').prefetch_related('items')
+        }
+
+    def test_drafts_grouped_by_supplier(self):
+        self.assertEqual(len(evaluate_reorder_points(self.ids)), 3)
+        self.assertEqual(self.drafts(), {
+            self.first_supplier.id: self.ids[:2],
+            self.second_supplier.id: self.ids[2:],
+        })
+        self.assertFalse(StockAlert.objects.filter(delivery__isnull=True).exists())
+
+    def test_open_alert_not_duplicated(self):
+        evaluate_reorder_points(self.ids)
+        self.assertEqual(evaluate_reorder_points(self.ids), [])
+        self.assertEqual(StockAlert.objects.count(), 3)
+        self.assertEqual(Delivery.objects.count(), 2)
+
+    def test_restock_resolves_alert(self):
+        evaluate_reorder_points(self.ids)
+        Product.objects.filter(id=self.ids[0]).update(quantity=50)
+        evaluate_reorder_points(self.ids)
+        self.assertEqual(
+            list(StockAlert.objects.filter(resolved_at__isnull=True)
+                 .order_by('product_id').values_list('product_id', flat=True)),
+            self.ids[1:]
+        )
+
+    def test_no_draft_for_conflicting_alert(self):
+        # Параллельный вызов успел создать уведомление и черновик для товара
+        # между проверкой открытых уведомлений и вставкой
+        concurrent = Delivery.objects.create(supplier=self.first_supplier, status='draft')
+        bulk_create = StockAlert.objects.bulk_create
+
+        def insert_concurrently(alerts, **kwargs):
+            StockAlert.objects.create(product=self.products[0], quantity=2,
+                                      reorder_point=5, delivery=concurrent)
+            return bulk_create(alerts, **kwargs)
+
+        with mock.patch.object(StockAlert.objects, 'bulk_create', insert_concurrently):
+            alerts = evaluate_reorder_points(self.ids)
+        self.assertEqual(sorted(alert.product_id for alert in alerts), self.ids[1:])
+        self.assertEqual(
+            DeliveryItem.objects.filter(product=self.products[0]).count(), 0
+        )
+        self.assertEqual(self.drafts(), {
+            self.first_supplier.id: self.ids[1:2],
+            self.second_supplier.id: self.ids[2:],
+        })
+
+
+class DraftDeliveryExpiryTests(APITestCase):
+
+    def setUp(self):
+        self.product = create_product(quantity=10, reorder_point=5)
+        self.supplier = create_supplier(self.product.category)
+        self.buyer = create_buyer()
+
+    def order(self, quantity):
+        response = self.client.post('/api/orders/', {
+            'buyer': self.buyer.id,
+            'items': [{'product': self.product.id, 'quantity': quantity}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def test_expired_reorder_draft_closes_alert(self):
+        self.order(6)
+        alert = StockAlert.objects.get(product=self.product, resolved_at__isnull=True)
+        self.assertEqual(alert.delivery.status, 'draft')
+
+        self.assertEqual(expire_drafts(delivery_hours=0)['deliveries'], 1)
+        alert.refresh_from_db()
+        self.assertIsNotNone(alert.resolved_at)
+
+        self.order(1)
+        self.assertEqual(
+            Delivery.objects.filter(status='draft', stock_alerts__product=self.product).count(), 1
+        )
+
+
+class AsgiApplicationTests(TransactionTestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Category')
+        for i in range(20):
+            create_product(name=f'Product {i} ' * 10, category=category)
+
+    def get(self, path, host=b'127.0.0.1', headers=(), query_string=b''):
+        return asgi_get(path, host, headers, query_string)
+
+    def test_product_list(self):
+        status, headers, body = self.get('/api/products/')
+        self.assertEqual(status, 200)
+        self.assertEqual(body, self.client.get('/api/products/', HTTP_HOST='127.0.0.1').content)
+
+    def test_disallowed_host(self):
+        self.assertEqual(self.get('/api/products/', host=b'evil.example')[0], 400)
+        self.assertEqual(self.get('/api/stock/changes/', host=b'evil.example')[0], 400)
+
+    def test_pk_out_of_range(self):
+        for path in ('/api/products/', '/api/buyers/', '/api/suppliers/'):
+            self.assertEqual(self.get(f'{path}{10 ** 30}/')[0], 404)
+
+    def test_recent_orders_negative_limit(self):
+        status, headers, body = self.get('/api/orders/recent_orders/',
+                                         query_string=b'limit=-1')
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body), [])
+
+    def test_compression(self):
+        status, headers, body = self.get('/api/products/',
+                                         headers=[(b'accept-encoding', b'gzip')])
+        self.assertEqual(headers[b'content-encoding'], b'gzip')
+        self.assertEqual(gzip.decompress(body),
+                         self.client.get('/api/products/', HTTP_HOST='127.0.0.1').content)
+
+    def test_stock_feed_compression(self):
+        product = Product.objects.first()
+        StockChange.objects.bulk_create(
+            StockChange(product=product, quantity=i) for i in range(50)
+        )
+        with mock.patch.object(streams, 'feed', StockChangeFeed()):
+            status, headers, body = self.get(
+                '/api/stock/changes/', query_string=b'since=0&timeout=0',
+                headers=[(b'accept-encoding', b'gzip')]
+            )
+        self.assertEqual(headers[b'content-encoding'], b'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(body))['changes']), 50)
+
+
+@override_settings(COMPRESSION_MIN_SIZE=100)
+class CompressionMiddlewareTests(SimpleTestCase):
+
+    def process(self, response, accept_encoding='gzip'):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_small_response_not_compressed(self):
+        response = self.process(HttpResponse(b'x' * 99))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertFalse(response.has_header('Vary'))
+        self.assertEqual(response.content, b'x' * 99)
+
+    def test_compressed_with_weak_etag(self):
+        response = HttpResponse(b'x' * 1000)
+        response['ETag'] = '"abc"'
+        response = self.process(response)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['ETag'], 'W/"abc"')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(gzip.decompress(response.content), b'x' * 1000)
+
+    def test_not_accepted(self):
+        response = HttpResponse(b'x' * 1000)
+        response['ETag'] = '"abc"'
+        response = self.process(response, accept_encoding='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['ETag'], '"abc"')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    def test_streaming_chunks_flushed(self):
+        produced = []
+
+        def chunks():
+            for i in range(3):
+                produced.append(i)
+                yield f'chunk {i};'.encode()
+
+        response = self.process(StreamingHttpResponse(chunks()))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        content = iter(response.streaming_content)
+        # Каждый чанк можно распаковать, не дожидаясь следующих
+        for i in range(3):
+            self.assertEqual(decompressor.decompress(next(content)), f'chunk {i};'.encode())
+            self.assertEqual(produced, list(range(i + 1)))
+        for rest in content:
+            self.assertEqual(decompressor.decompress(rest), b'')
+        self.assertTrue(decompressor.eof)
+
+    @skipIf(middleware.brotli is None, 'brotli is not installed')
+    def test_brotli_preferred(self):
+        response = self.process(HttpResponse(b'x' * 1000), accept_encoding='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(middleware.brotli.decompress(response.content), b'x' * 1000)
+
+
+class StockChangeFeedTests(TransactionTestCase):
+
+    def test_changes_recorded_after_commit(self):
+        product = create_product(quantity=10)
+        response = self.client.post('/api/orders/', {
+            'buyer': create_buyer().id,
+            'items': [{'product': product.id, 'quantity': 4}],
+        }, content_type='application/json', HTTP_HOST='127.0.0.1')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            list(StockChange.objects.values_list('product_id', 'quantity')),
+            [(product.id, 6)]
+        )
+
+    def test_publishes_up_to_gap(self):
+        feed = StockChangeFeed(gap_timeout=5)
+        feed._last_id = 10
+        changes = [{'id': 11}, {'id': 12}, {'id': 14}]
+        self.assertEqual(feed._contiguous(changes, now=100), [{'id': 11}, {'id': 12}])
+        feed._last_id = 12
+        self.assertEqual(feed._contiguous(changes[2:], now=103), [])
+        self.assertEqual(feed._contiguous([{'id': 13}, {'id': 14}], now=104),
+                         [{'id': 13}, {'id': 14}])
+
+    def test_skips_stale_gap(self):
+        feed = StockChangeFeed(gap_timeout=5)
+        feed._last_id = 10
+        self.assertEqual(feed._contiguous([{'id': 12}], now=100), [])
+        self.assertEqual(feed._contiguous([{'id': 12}], now=106), [{'id': 12}])
+
+
+class SupplierIndexTests(APITestCase):
+
+    def test_invalidation_reaches_other_processes(self):
+        category = Category.objects.create(name='Category')
+        supplier = create_supplier(category)
+        worker, other_worker = SupplierIndex(), SupplierIndex()
+        self.assertEqual(worker.get()[category.id], ((supplier.id, 'Supplier'),))
+        Supplier.product_category.through.objects.all().delete()
+        other_worker.invalidate()
+        self.assertEqual(worker.get(), {})
+
+
+class TokenBucketTests(APITestCase):
+
+    def registry(self):
+        registry = BucketRegistry()
+        # Синхронизация вызывается в тесте явно, без фонового потока
+        registry._sync_pid = os.getpid()
+        return registry
+
+    def test_bucket_limits_burst(self):
+        registry = self.registry()
+        results = [registry.consume('test-burst', 3, 0.001)[0] for _ in range(4)]
+        self.assertEqual(results, [True, True, True, False])
+
+    def test_sync_subtracts_other_workers_usage(self):
+        worker, other_worker = self.registry(), self.registry()
+        for registry in (worker, other_worker):
+            registry.consume('test-sync', 10, 0.001)
+            registry.sync()
+        for _ in range(5):
+            other_worker.consume('test-sync', 10, 0.001)
+        other_worker.sync()
+        worker.sync()
+        results = [worker.consume('test-sync', 10, 0.001)[0] for _ in range(4)]
+        self.assertEqual(results, [True, True, True, False])
+
+
+class DatabaseLoadThrottleTests(APITestCase):
+
+    def setUp(self):
+        self.product = create_product(quantity=100)
+        self.buyer = create_buyer()
+        registry = BucketRegistry()
+        registry._sync_pid = os.getpid()
+        self.latency = 0.0
+        for patcher in (
+                mock.patch.object(throttling, 'buckets', registry),
+                mock.patch.object(throttling.db_latency, 'get', lambda: self.latency),
+                mock.patch.object(TokenBucketThrottle, 'THROTTLE_RATES', {'orders': '2/min'})):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def order(self):
+        return self.client.post('/api/orders/', {
+            'buyer': self.buyer.id,
+            'items': [{'product': self.product.id, 'quantity': 1}],
+        }, format='json')
+
+    @override_settings(DB_LATENCY_THRESHOLD=0.5, DB_LATENCY_RETRY_AFTER=5)
+    def test_slow_database_sheds_writes_only(self):
+        self.latency = 0.8
+        response = self.order()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '5')
+        self.assertEqual(self.client.get('/api/orders/').status_code, 200)
+
+    @override_settings(DB_LATENCY_THRESHOLD=0.5)
+    def test_shed_requests_do_not_spend_tokens(self):
+        self.latency = 0.8
+        for _ in range(3):
+            self.assertEqual(self.order().status_code, 429)
+        self.latency = 0.1
+        self.assertEqual([self.order().status_code for _ in range(3)], [201, 201, 429])
+
+    @override_settings(DB_LATENCY_PROBE_INTERVAL=0)
+    def test_latency_is_smoothed(self):
+        latency = DatabaseLatency(smoothing=0.5)
+        with mock.patch.object(latency, 'probe', side_effect=[1.0, 1.0, 0.0]):
+            self.assertEqual([latency.get() for _ in range(3)], [0.5, 0.75, 0.375])
+
+    @override_settings(DB_LATENCY_PROBE_INTERVAL=60)
+    def test_latency_probed_once_per_interval(self):
+        latency = DatabaseLatency(smoothing=0.5)
+        with mock.patch.object(latency, 'probe', return_value=1.0) as probe:
+            self.assertEqual([latency.get() for _ in range(3)], [0.5, 0.5, 0.5])
+        self.assertEqual(probe.call_count, 1)
+
+
+class AdminChangelistQueryTests(TestCase):
+    """Число запросов страницы списка в админке не зависит от числа строк"""
+    URLS = (
+        '/admin/api_v1/product/',
+        '/admin/api_v1/order/',
+        '/admin/api_v1/delivery/',
+        '/admin/api_v1/orderitem/',
+        '/admin/api_v1/deliveryitem/',
+    )
+
+    def setUp(self):
+        self.client.force_login(
+            User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        )
+        self.category = Category.objects.create(name='Category')
+        self.buyer = create_buyer()
+        self.supplier = create_supplier(self.category)
+        self.add_rows(5)
+
+    def add_rows(self, count):
+        for _ in range(count):
+            products = [create_product(category=self.category) for _ in range(2)]
+            order = Order.objects.create(buyer=self.buyer)
+            delivery = Delivery.objects.create(supplier=self.supplier)
+            for product in products:
+                OrderItem.objects.create(order=order, product=product, quantity=1)
+                DeliveryItem.objects.create(delivery=delivery, product=product, quantity=1)
+
+    def test_query_count_does_not_grow(self):
+        counts = {}
+        for url in self.URLS:
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            counts[url] = len(queries)
+        self.add_rows(10)
+        for url in self.URLS:
+            with self.subTest(url=url), self.assertNumQueries(counts[url]):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_delivery_totals_from_prefetched_items(self):
+        request = RequestFactory().get('/admin/api_v1/delivery/')
+        request.user = User.objects.get(username='admin')
+        delivery_admin = DeliveryAdmin(Delivery, admin_site)
+        for delivery in delivery_admin.get_queryset(request):
+            with self.assertNumQueries(0):
+                items_set = delivery_admin.items_set(delivery)
+                total = delivery_admin.total_values(delivery)
+            self.assertEqual(total, delivery.total_values)
+            self.assertEqual(items_set, ', '.join(
+                f'{item.product.name} - {item.quantity}'
+                for item in DeliveryItem.objects.filter(delivery=delivery).order_by('id')
+            ))
+
+    def test_category_filter_lists_categories(self):
+        Category.objects.create(name='Empty category')
+        response = self.client.get('/admin/api_v1/product/')
+        self.assertEqual(
+            [choice['display'] for choice in response.context['cl'].filter_specs[0].choices(
+                response.context['cl'])][1:],
+            ['Category', 'Empty category']
+        )
+
+
+class EstimatedCountPaginatorTests(TestCase):
+
+    def setUp(self):
+        self.buyer = create_buyer()
+        for _ in range(3):
+            Order.objects.create(buyer=self.buyer)
+
+    def count(self, queryset, reltuples):
+        """Число строк на PostgreSQL со статистикой reltuples"""
+        cursor = mock.MagicMock()
+        cursor.__enter__.return_value.fetchone.return_value = (reltuples,)
+        fake = mock.Mock(vendor='postgresql', cursor=mock.Mock(return_value=cursor))
+        with mock.patch.object(admin_module, 'connections', {'default': fake}):
+            with mock.patch.object(Paginator, 'count', 'exact'):
+                return EstimatedCountPaginator(queryset.order_by('id'), 100).count
+
+    def test_estimate_for_large_unfiltered_table(self):
+        self.assertEqual(self.count(Order.objects.all(), 2.5e6), 2500000)
+
+    def test_exact_for_small_or_filtered_table(self):
+        self.assertEqual(self.count(Order.objects.all(), 1000.0), 'exact')
+        self.assertEqual(self.count(Order.objects.filter(status='active'), 2.5e6), 'exact')
+
+    def test_exact_on_other_databases(self):
+        self.assertEqual(EstimatedCountPaginator(Order.objects.order_by('id'), 100).count, 3)
+
+
+class PriceAsOfTests(TestCase):
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.product = create_product(price=100)
+        PriceHistory.objects.filter(product=self.product).delete()
+        PriceHistory.objects.bulk_create([
+            PriceHistory(product=self.product, price=100,
+                         valid_from=self.now - timedelta(days=10)),
+            PriceHistory(product=self.product, price=150,
+                         valid_from=self.now - timedelta(days=5)),
+        ])
+        Product.objects.filter(id=self.product.id).update(price=200)
+        self.product.refresh_from_db()
+        self.buyer = create_buyer()
+
+    def order(self, days_ago):
+        order = Order.objects.create(buyer=self.buyer)
+        Order.objects.filter(id=order.id).update(
+            created_at=self.now - timedelta(days=days_ago)
+        )
+        OrderItem.objects.create(order=order, product=self.product, quantity=2)
+        return order
+
+    def test_price_at(self):
+        self.assertEqual(price_at(self.product, self.now - timedelta(days=7)), 100)
+        self.assertEqual(price_at(self.product, self.now - timedelta(days=1)), 150)
+        self.assertEqual(price_at(self.product, self.now - timedelta(days=20)), 200)
+
+    def test_with_prices_matches_price_at(self):
+        expected = {self.order(days).id: price for days, price in ((7, 100), (1, 150), (20, 200))}
+        items = with_prices(OrderItem.objects.all(), 'order__created_at')
+        self.assertEqual({item.order_id: item.unit_price for item in items}, expected)
+        for item in OrderItem.objects.select_related('order', 'product'):
+            self.assertEqual(item.get_item_price, expected[item.order_id] * 2)
+
+    def test_price_change_is_recorded(self):
+        self.product.price = 300
+        self.product.save()
+        self.assertEqual(price_at(self.product, timezone.now()), 300)
+        self.assertEqual(price_at(self.product, self.now - timedelta(days=1)), 150)
+
+
+class PriceHistoryMigrationTests(TransactionTestCase):
+
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([target])
+        return executor.loader.project_state([target]).apps
+
+    def test_seeds_history_for_many_products(self):
+        latest = MigrationExecutor(connection).loader.graph.leaf_nodes('api_v1')[0]
+        apps = self.migrate(('api_v1', '0009_soft_delete'))
+        try:
+            category = apps.get_model('api_v1', 'Category').objects.create(name='Category')
+            apps.get_model('api_v1', 'Product').objects.bulk_create(
+                apps.get_model('api_v1', 'Product')(
+                    name=f'Product {i}', sku=f'SKU-{i}', category=category,
+                    quantity=0, price=i + 1
+                )
+                for i in range(600)
+            )
+            apps = self.migrate(('api_v1', '0010_price_history'))
+            self.assertEqual(apps.get_model('api_v1', 'PriceHistory').objects.count(), 600)
+        finally:
+            self.migrate(latest)
+
+
+class OrderArchiveTests(TestCase):
+
+    def test_only_closed_orders_are_archived(self):
+        buyer = create_buyer()
+        orders = {
+            status: Order.objects.create(buyer=buyer, status=status)
+            for status in ('active', 'draft', 'fulfilled', 'cancelled')
+        }
+        order_archiver.run(timezone.now() + timedelta(seconds=1), chunk_size=10)
+        self.assertEqual(
+            set(ArchivedOrder.objects.values_list('id', flat=True)),
+            {orders['fulfilled'].id, orders['cancelled'].id}
+        )
+        self.assertEqual(
+            set(Order.objects.values_list('status', flat=True)), {'active', 'draft'}
+        )
+
+class ArchiveRangeListTests(TransactionTestCase):
+
+    def setUp(self):
+        self.buyer = create_buyer()
+        self.now = timezone.now()
+
+    def order(self, days_ago, status):
+        order = Order.objects.create(buyer=self.buyer, status=status)
+        Order.objects.filter(id=order.id).update(created_at=self.now - timedelta(days=days_ago))
+
+    def list_pages(self, days):
+        """Страницы списка заказов через ASGI-приложение по ссылкам next"""
+        query_string = urlencode({
+            'created_after': (self.now - timedelta(days=days)).isoformat()
+        }).encode()
+        pages = []
+        while True:
+            status, headers, body = asgi_get('/api/orders/', query_string=query_string)
+            self.assertEqual(status, 200, body)
+            page = json.loads(body)
+            pages.append([order['status'] for order in page['results']])
+            if page['next'] is None:
+                return pages
+            query_string = urlsplit(page['next']).query.encode()
+
+    @override_settings(ARCHIVE_LIST_PAGE_SIZE=2)
+    def test_historical_range_is_paginated_in_created_order(self):
+        for days_ago in (396, 400, 398):
+            self.order(days_ago, 'fulfilled')
+        order_archiver.run(self.now - timedelta(days=365), chunk_size=10)
+        for days_ago in (397, 401, 399):
+            self.order(days_ago, 'active')
+
+        self.assertEqual(self.list_pages(500), [['active', 'fulfilled']] * 3)
+
+    def test_archive_with_shorter_horizon_is_read(self):
+        self.order(20, 'fulfilled')
+        self.order(5, 'active')
+        order_archiver.run(self.now - timedelta(days=10), chunk_size=10)
+        self.assertEqual(ArchivedOrder.objects.count(), 1)
+        self.assertEqual(self.list_pages(30), [['fulfilled', 'active']])
+
+
+class PickListTests(APITestCase):
+
+    def setUp(self):
+        self.buyer = create_buyer()
+        self.far = create_product(name='Far', sku='FAR', bin_location='C-03')
+        self.near = create_product(name='Near', sku='NEAR', bin_location='A-01')
+
+    def order(self, status='active', **quantities):
+        order = Order.objects.create(buyer=self.buyer, status=status)
+        for name, quantity in quantities.items():
+            product = getattr(self, name)
+            OrderItem.objects.create(order=order, product=product, quantity=quantity)
+        return order
+
+    def test_wave_lines(self):
+        first = self.order(far=1, near=2)
+        second = self.order(far=3)
+        self.order(status='draft', far=5)
+        self.order(status='fulfilled', near=7)
+
+        response = self.client.get('/api/orders/pick_list/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['orders'], [first.id, second.id])
+        [pick_list] = response.data['pick_lists']
+        self.assertEqual(
+            [(line['bin_location'], line['quantity'], line['orders'])
+             for line in pick_list['lines']],
+            [('A-01', 2, 1), ('C-03', 4, 2)]
+        )
+        self.assertEqual(Order.objects.filter(status='active').count(), 2)
+
+    def test_fulfil_wave(self):
+        first = self.order(far=1)
+        second = self.order(near=1)
+        response = self.client.post('/api/orders/pick_list/?size=1')
+        self.assertEqual(response.data['orders'], [first.id])
+        self.assertEqual(Order.objects.get(id=first.id).status, 'fulfilled')
+        self.assertEqual(Order.objects.get(id=second.id).status, 'active')
+        self.assertEqual(self.client.post('/api/orders/pick_list/').data['orders'], [second.id])
+        self.assertEqual(self.client.post('/api/orders/pick_list/').data['orders'], [])
+
+    def test_text_rendering(self):
+        self.order(far=1, near=2)
+        response = self.client.get('/api/orders/pick_list/?format=txt')
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        rows = response.content.decode().splitlines()
+        self.assertEqual(rows[0], 'Лист подбора: Без склада, заказов: 1')
+        self.assertEqual(rows[2].split(), ['A-01', 'NEAR', 'Near', '2'])
+        self.assertEqual(rows[3].split(), ['C-03', 'FAR', 'Far', '1'])
+
+    @override_settings(PICK_WAVE_MAX_SIZE=10)
+    def test_size_limit(self):
+        for size in ('0', '11', 'many'):
+            response = self.client.get(f'/api/orders/pick_list/?size={size}')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('size', response.data)
+        response = self.client.get('/api/orders/pick_list/?size=11&format=txt')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.content.decode(), 'size: Must be between 1 and 10')
+
+
+class ForecastingTests(TestCase):
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.start = (self.now - timedelta(days=60)).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        self.buyer = create_buyer()
+        self.supplier = create_supplier()
+        self.products = [create_product(), create_product()]
+
+    def order(self, product, days_ago, quantity, archived=False):
+        created_at = self.now - timedelta(days=days_ago)
+        if archived:
+            order = ArchivedOrder.objects.create(
+                id=10 ** 6 + ArchivedOrder.objects.count(), buyer=self.buyer,
+                created_at=created_at, status='fulfilled'
+            )
+            ArchivedOrderItem.objects.create(order=order, product=product, quantity=quantity)
+        else:
+            order = Order.objects.create(buyer=self.buyer)
+            Order.objects.filter(id=order.id).update(created_at=created_at)
+            OrderItem.objects.create(order=order, product=product, quantity=quantity)
+
+    def delivery(self, product, days_ago, archived=False):
+        created_at = self.now - timedelta(days=days_ago)
+        if archived:
+            delivery = ArchivedDelivery.objects.create(
+                id=10 ** 6 + ArchivedDelivery.objects.count(), supplier=self.supplier,
+                created_at=created_at, status='active'
+            )
+            ArchivedDeliveryItem.objects.create(delivery=delivery, product=product, quantity=1)
+        else:
+            delivery = Delivery.objects.create(supplier=self.supplier)
+            Delivery.objects.filter(id=delivery.id).update(created_at=created_at)
+            DeliveryItem.objects.create(delivery=delivery, product=product, quantity=1)
+
+    def test_sales_skip_unknown_products_and_include_archive(self):
+        product_ids, quantities = forecasting.load_products()
+        first, second = self.products
+        self.order(first, 5, 3)
+        self.order(second, 50, 4, archived=True)
+        # Товар создан после выгрузки каталога, его id больше всех известных
+        self.order(create_product(), 5, 7)
+        sales = forecasting.load_sales(product_ids, self.start, 61)
+        self.assertEqual(sales.sum(axis=1).tolist(), [3, 4])
+
+    def test_lead_times_from_live_and_archived_deliveries(self):
+        first, second = self.products
+        for days_ago in (30, 20, 10):
+            self.delivery(first, days_ago)
+        self.delivery(second, 40, archived=True)
+        self.delivery(second, 10)
+        product_ids, quantities = forecasting.load_products()
+        lead_times = forecasting.load_lead_times(product_ids, self.start, 7)
+        self.assertEqual(lead_times.round(3).tolist(), [10, 30])
+
+    def test_forecast_math(self):
+        sales = np.array([[0, 2, 4], [3, 3, 3], [0, 0, 0]], dtype=np.float32)
+        result = forecasting.forecast(
+            sales, quantities=np.array([1, 50, 0]), lead_times=np.array([4., 4., 7.]),
+            alpha=0.5, z=2, review_days=7, chunk_size=2
+        )
+        # Веса дней 0.25, 0.5, 1 нормируются на 1.75
+        self.assertEqual(result['daily_demand'].round(4).tolist(), [2.8571, 3, 0])
+        self.assertEqual(result['demand_std'].round(4).tolist(), [1.633, 0, 0])
+        # ceil(2 * 1.633 * 2) = 7, ceil(2.857 * 4 + 7) = 19, ceil(19 + 20 - 1) = 38
+        self.assertEqual(result['safety_stock'].tolist(), [7, 0, 0])
+        self.assertEqual(result['reorder_point'].tolist(), [19, 12, 0])
+        self.assertEqual(result['suggested_quantity'].tolist(), [38, 0, 0])
+
+    def test_reorder_points_kept_without_sales(self):
+        first, second = self.products
+        Product.objects.filter(id=second.id).update(reorder_point=15)
+        for days_ago in (3, 2, 1):
+            self.order(first, days_ago, 5)
+        forecasting.run(days=30, update_reorder_points=True)
+        self.assertGreater(Product.objects.get(id=first.id).reorder_point, 0)
+        self.assertEqual(Product.objects.get(id=second.id).reorder_point, 15)
+
+
+class SeedDataTests(TestCase):
+    COUNTS = dict(users=1, categories=2, products=5, suppliers=2, buyers=3,
+                  orders=10, deliveries=4)
+
+    def seed(self, **options):
+        call_command('seed_data', stdout=io.StringIO(), **{**self.COUNTS, **options})
+
+    def snapshot(self):
+        return (
+            list(Product.objects.order_by('id').values_list('category_id', 'quantity', 'price')),
+            list(Order.objects.order_by('id').values_list('buyer_id', 'status', 'created_at')),
+            list(OrderItem.objects.order_by('id').values_list('order_id', 'product_id', 'quantity')),
+            list(Delivery.objects.order_by('id').values_list('supplier_id', 'created_at')),
+        )
+
+    def clear(self):
+        for model in (OrderItem, Order, DeliveryItem, Delivery, PriceHistory,
+                      Product, Supplier, Buyer, Category, User):
+            model.objects.all().delete()
+
+    def test_deterministic_for_epoch(self):
+        self.seed(epoch=date(2020, 9, 1))
+        first = self.snapshot()
+        self.assertEqual(Order.objects.count(), 10)
+        epoch = datetime(2020, 9, 1, tzinfo=dt_timezone.utc)
+        self.assertTrue(all(
+            epoch - timedelta(days=365) <= created_at < epoch
+            for buyer, status, created_at in first[1]
+        ))
+        self.clear()
+        self.seed(epoch=date(2020, 9, 1))
+        self.assertEqual(self.snapshot(), first)
+        self.clear()
+        self.seed(epoch=date(2020, 9, 2))
+        shifted = self.snapshot()
+        self.assertEqual(shifted[2], first[2])
+        self.assertEqual(
+            [created_at - timedelta(days=1) for buyer, status, created_at in shifted[1]],
+            [created_at for buyer, status, created_at in first[1]]
+        )
+
+    def test_documents_require_owners(self):
+        for options in ({'buyers': 0}, {'suppliers': 0, 'orders': 0}):
+            with self.assertRaisesRegex(CommandError, 'without'):
+                self.seed(**options)
+            self.clear()
+
+    def test_no_documents_without_owners_requested(self):
+        self.seed(buyers=0, orders=0, suppliers=0, deliveries=0)
+        self.assertEqual(Product.objects.count(), 5)
+        self.assertFalse(Order.objects.exists())
+
+
+class StockAllocationTests(APITestCase):
+
+    def setUp(self):
+        self.product = create_product(quantity=10)
+        self.buyer = create_buyer()
+        self.near = Warehouse.objects.create(name='Near', address='A', latitude=55.75, longitude=37.61)
+        self.far = Warehouse.objects.create(name='Far', address='B', latitude=59.93, longitude=30.31)
+        WarehouseStock.objects.create(warehouse=self.near, product=self.product, quantity=3)
+        WarehouseStock.objects.create(warehouse=self.far, product=self.product, quantity=5)
+
+    def order(self, quantity):
+        return self.client.post('/api/orders/', {
+            'buyer': self.buyer.id,
+            'warehouse': self.near.id,
+            'items': [{'product': self.product.id, 'quantity': quantity}],
+        }, format='json')
+
+    def stock(self):
+        self.product.refresh_from_db()
+        return (self.product.quantity,
+                *WarehouseStock.objects.order_by('warehouse_id').values_list('quantity', flat=True))
+
+    def allocation(self):
+        return list(OrderItem.objects.order_by('id').values_list('warehouse_id', 'quantity'))
+
+    def test_whole_line_from_nearest_warehouse_with_stock(self):
+        self.assertEqual(self.order(4).status_code, 201)
+        self.assertEqual(self.allocation(), [(self.far.id, 4)])
+        self.assertEqual(self.stock(), (6, 3, 1))
+
+    def test_line_split_between_warehouses_and_unassigned_stock(self):
+        self.assertEqual(self.order(9).status_code, 201)
+        self.assertEqual(self.allocation(),
+                         [(self.near.id, 3), (self.far.id, 5), (None, 1)])
+        self.assertEqual(self.stock(), (1, 0, 0))
+
+    def test_not_enough_stock(self):
+        self.assertEqual(self.order(11).status_code, 400)
+        self.assertEqual(self.stock(), (10, 3, 5))
+
+    def test_product_deleted_before_locking(self):
+        order = Order.objects.create(buyer=self.buyer)
+        product = Product.objects.get(id=self.product.id)
+        Product.objects.filter(id=product.id).delete()
+        with self.assertRaises(ValidationError):
+            allocate_order(order, [{'product': product, 'quantity': 1}])
+
+    def test_quantity_cannot_be_set_directly(self):
+        url = f'/api/products/{self.product.id}/'
+        response = self.client.patch(url, {'quantity': 100}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('quantity', response.data)
+        response = self.client.patch(url, {'quantity': 10, 'price': 150}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.stock(), (10, 3, 5))
+
+    def adjust(self, delta, warehouse=None):
+        return self.client.post(f'/api/products/{self.product.id}/adjust-stock/', {
+            'delta': delta, 'warehouse': warehouse and warehouse.id,
+        }, format='json')
+
+    def test_adjust_stock_on_warehouse_and_unassigned(self):
+        self.assertEqual(self.adjust(-3, self.far).status_code, 200)
+        self.assertEqual(self.stock(), (7, 3, 2))
+        self.assertEqual(self.adjust(4).status_code, 200)
+        self.assertEqual(self.stock(), (11, 3, 2))
+
+    def test_adjust_stock_cannot_go_negative(self):
+        self.assertEqual(self.adjust(-4, self.near).status_code, 400)
+        # Без склада доступны только 2 единицы: 10 - 3 - 5
+        self.assertEqual(self.adjust(-3).status_code, 400)
+        self.assertEqual(self.stock(), (10, 3, 5))
+
+
+class AuditFlushTests(APITransactionTestCase):
+
+    def test_expire_drafts_command_flushes_release_events(self):
+        product = create_product(quantity=10)
+        response = self.client.post('/api/orders/', {
+            'buyer': create_buyer().id,
+            'status': 'draft',
+            'items': [{'product': product.id, 'quantity': 4}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(StockAuditEvent.objects.count(), 1)
+
+        call_command('expire_drafts', order_hours=0, stdout=open(os.devnull, 'w'))
+        self.assertEqual(
+            list(StockAuditEvent.objects.order_by('id').values_list('delta', flat=True)),
+            [-4, 4]
+        )
+
+    def test_replay_fallback_loads_all_or_nothing(self):
+        now = timezone.now()
+        events = [StockAuditEvent(product_id=1, delta=1, quantity=i, source='order',
+                                  object_id=i, created_at=now) for i in range(1500)]
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'audit.jsonl')
+            audit.write_fallback(events, filename)
+            with open(filename, 'a') as fallback:
+                fallback.write(json.dumps({'product_id': 1, 'delta': None, 'quantity': 0,
+                                           'source': 'order', 'object_id': 0,
+                                           'created_at': now.isoformat()}) + '\n')
+            with self.assertRaises(IntegrityError):
+                audit.replay_fallback(filename)
+            self.assertEqual(StockAuditEvent.objects.count(), 0)
+            self.assertTrue(os.path.exists(f'{filename}.replay'))
+
+
+class DeletionJobTests(TestCase):
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Category')
+        create_product(category=self.category)
+        self.job = DeletionJob.objects.create(model='category', object_id=self.category.id)
+
+    def test_job_is_claimed_once(self):
+        self.assertTrue(claim_job(self.job.id))
+        self.assertFalse(claim_job(self.job.id))
+        self.assertIsNone(run_job(self.job.id))
+        self.assertTrue(Category.objects.filter(id=self.category.id).exists())
+
+    def test_stale_job_is_reclaimed(self):
+        self.assertTrue(claim_job(self.job.id))
+        DeletionJob.objects.filter(id=self.job.id).update(
+            heartbeat_at=timezone.now() - timedelta(hours=1)
+        )
+        job = run_job(self.job.id)
+        self.assertEqual(job.status, 'done')
+        self.assertFalse(Product.objects.filter(category_id=self.category.id).exists())
+        self.assertFalse(Category.objects.filter(id=self.category.id).exists())
+
+
+class CategoryDeletionTests(APITestCase):
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Deleted')
+        self.product = create_product(category=self.category)
+        self.buyer = create_buyer()
+
+    def order(self):
+        return self.client.post('/api/orders/', {
+            'buyer': self.buyer.id,
+            'items': [{'product': self.product.id, 'quantity': 1}],
+        }, format='json')
+
+    def delete(self, policy):
+        return self.client.delete(f'/api/categories/{self.category.id}/?on_history={policy}')
+
+    def test_refuse_with_history(self):
+        self.assertEqual(self.order().status_code, 201)
+        self.assertEqual(self.delete('refuse').status_code, 409)
+        self.category.refresh_from_db()
+        self.assertFalse(self.category.is_deleted)
+
+    def test_soft_with_history(self):
+        self.assertEqual(self.order().status_code, 201)
+        self.assertEqual(self.delete('soft').status_code, 204)
+        self.category.refresh_from_db()
+        self.assertTrue(self.category.is_deleted)
+        self.assertTrue(OrderItem.objects.filter(product=self.product).exists())
+
+        self.assertEqual(self.client.get(f'/api/products/{self.product.id}/').status_code, 404)
+        self.assertNotIn(self.product.id,
+                         [product['id'] for product in self.client.get('/api/products/').data])
+        response = self.order()
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('product', response.data['items'][0])
+
+    def test_delete_starts_job(self):
+        self.assertEqual(self.order().status_code, 201)
+        response = self.delete('delete')
+        self.assertEqual(response.status_code, 202)
+        job = DeletionJob.objects.get(id=response.data['id'])
+        self.assertEqual((job.model, job.object_id, job.status),
+                         ('category', self.category.id, 'pending'))
+        self.assertEqual(self.client.get('/api/categories/').data, [])
+
+        self.assertEqual(run_job(job.id).status, 'done')
+        self.assertFalse(Category.objects.filter(id=self.category.id).exists())
+        self.assertFalse(OrderItem.objects.filter(product_id=self.product.id).exists())
+
+    def test_without_history_deleted_by_job(self):
+        self.assertEqual(self.delete('refuse').status_code, 202)
+        self.assertEqual(self.delete('soft').status_code, 404)
+
+    def test_name_reused_after_soft_delete(self):
+        self.assertEqual(self.order().status_code, 201)
+        self.assertEqual(self.delete('soft').status_code, 204)
+        response = self.client.post('/api/categories/', {'name': 'Deleted'})
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post('/api/categories/', {'name': 'Deleted'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('name', response.data)
+
+
+class SchemaTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.schema_file = os.path.join(directory.name, 'openapi.json')
+        override = override_settings(SCHEMA_CACHE_FILE=self.schema_file)
+        override.enable()
+        self.addCleanup(override.disable)
+        patcher = mock.patch.object(yasg, 'cached_schema', yasg.CachedSchema())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, accept_encoding, **headers):
+        return self.client.get('/api/swagger.json', HTTP_HOST='127.0.0.1',
+                               HTTP_ACCEPT_ENCODING=accept_encoding, **headers)
+
+    def test_schema_written_to_cache_file(self):
+        self.get('identity')
+        with open(self.schema_file) as schema_file:
+            self.assertEqual(json.load(schema_file)[yasg.VERSION_KEY], yasg.code_version())
+
+    def test_etag_per_encoding(self):
+        gzipped, identity = self.get('gzip'), self.get('identity')
+        self.assertNotEqual(gzipped['ETag'], identity['ETag'])
+        self.assertEqual(self.get('gzip', HTTP_IF_NONE_MATCH=gzipped['ETag']).status_code, 304)
+        self.assertEqual(self.get('identity', HTTP_IF_NONE_MATCH=gzipped['ETag']).status_code, 200)
+        self.assertEqual(self.get('gzip', HTTP_IF_NONE_MATCH=identity['ETag']).status_code, 200)
+
+    def test_code_version_covers_project_sources(self):
+        with mock.patch.object(yasg.os, 'stat', wraps=os.stat) as stat:
+            yasg.code_version()
+        sources = {os.path.relpath(call[0][0], settings.BASE_DIR) for call in stat.call_args_list}
+        self.assertLessEqual(
+            {'api_v1/serializers.py', 'api_v1/migrations/0001_initial.py',
+             'stms_v1/settings.py', 'stms_v1/urls.py'},
+            sources
+        )
+
+    def test_gzip_follows_accept_encoding_quality(self):
+        self.assertEqual(self.get('gzip, br')['Content-Encoding'], 'gzip')
+        response = self.get('gzip;q=0, identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(json.loads(response.content)['info']['title'], 'STMS API')
+
+    def test_write_schema_replaces_file_atomically(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'openapi.json')
+            write_schema({'version': 1}, filename)
+            write_schema({'version': 2}, filename)
+            self.assertEqual(os.listdir(directory), ['openapi.json'])
+            with open(filename) as schema_file:
+                self.assertEqual(json.load(schema_file), {'version': 2})
+
+
+class StockAuditTests(APITransactionTestCase):
+
+    def events(self):
+        return list(StockAuditEvent.objects.order_by('id').values_list('source', 'delta', 'quantity'))
+
+    def test_product_create_and_adjustment_are_audited(self):
+        category = Category.objects.create(name='Category')
+        response = self.client.post('/api/products/', {
+            'name': 'Audited', 'sku': 'AUD-1', 'category': category.id,
+            'quantity': 7, 'price': 100,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        product_id = response.data['id']
+        response = self.client.post(f'/api/products/{product_id}/adjust-stock/',
+                                    {'delta': -2}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.events(), [('product', 7, 7), ('product', -2, 5)])
+
+    def test_admin_lists_events_of_deleted_products(self):
+        kept, deleted = create_product(quantity=0), create_product(quantity=0)
+        for product in (kept, deleted):
+            StockAuditEvent.objects.create(product=product, delta=1, quantity=1,
+                                           source='product')
+        Product.objects.filter(id=deleted.id).delete()
+        self.client.force_login(
+            User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        )
+        response = self.client.get('/admin/api_v1/stockauditevent/', HTTP_HOST='127.0.0.1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['cl'].result_list), 2)
+        self.assertContains(response, f'#{deleted.id} (удален)')
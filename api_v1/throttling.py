@@ -0,0 +1,212 @@
+"""
+Ограничение частоты записи и сброс нагрузки при медленной БД.
+
+TokenBucketThrottle держит token bucket на пару (scope, пользователь)
+в памяти процесса, поэтому проверка лимита не обращается к кэшу на каждом
+запросе. Раз в THROTTLE_SYNC_INTERVAL секунд фоновый поток процесса
+добавляет его расход токенов в общий счетчик в кэше и вычитает из корзин
+процесса расход остальных воркеров, так что лимит соблюдается примерно
+и на несколько процессов. Для этого кэш должен быть общим для процессов
+(CACHES в настройках), с локальным кэшем каждый процесс считает лимит
+отдельно.
+
+DatabaseLoadThrottle отклоняет запросы на запись с 429 и Retry-After,
+пока задержка БД (сглаженное время SELECT 1) выше DB_LATENCY_THRESHOLD.
+DRF опрашивает все throttle_classes, даже если запрос уже отклонен,
+поэтому DatabaseLoadThrottle ставится перед TokenBucketThrottle: за
+отклоненный по нагрузке запрос токен не списывается.
+Оба класса пропускают безопасные методы (GET, HEAD, OPTIONS).
+"""
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connection
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle, ScopedRateThrottle
+
+logger = logging.getLogger(__name__)
+
+SHARED_COUNTER_TIMEOUT = 24 * 60 * 60
+
+
+class TokenBucket:
+    """Корзина на capacity токенов, пополняется со скоростью rate в секунду"""
+
+    def __init__(self, capacity, rate, now):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = now
+        # Расход токенов, еще не добавленный в общий счетчик, и значение
+        # общего счетчика при последней синхронизации
+        self.unsynced = 0
+        self.shared_total = None
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self, now):
+        self.refill(now)
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        self.unsynced += 1
+        return True
+
+    def wait(self):
+        return max(0, (1 - self.tokens) / self.rate)
+
+    def is_idle(self, now):
+        return self.unsynced == 0 and self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class BucketRegistry:
+    """Корзины процесса и их синхронизация с общим кэшем"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._sync_pid = None
+
+    def consume(self, key, capacity, rate):
+        """Списывает токен, возвращает (разрешено, секунд до следующего токена)"""
+        self._start_sync()
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None or bucket.capacity != capacity or bucket.rate != rate:
+                bucket = self._buckets[key] = TokenBucket(capacity, rate, now)
+            allowed = bucket.consume(now)
+            wait = bucket.wait()
+        return allowed, wait
+
+    def _start_sync(self):
+        """
+        Запускает поток синхронизации при первом запросе процесса. Потоки
+        не переживают fork, поэтому поток запускается заново в каждом воркере
+        """
+        pid = os.getpid()
+        if self._sync_pid == pid:
+            return
+        with self._lock:
+            if self._sync_pid == pid:
+                return
+            self._sync_pid = pid
+        threading.Thread(target=self._sync_loop, name='throttle-sync', daemon=True).start()
+
+    def _sync_loop(self):
+        while True:
+            time.sleep(settings.THROTTLE_SYNC_INTERVAL)
+            try:
+                self.sync()
+            except Exception:
+                logger.exception('Throttle sync failed')
+            finally:
+                close_old_connections()
+
+    def sync(self):
+        """Обменивается расходом токенов с остальными процессами через кэш"""
+        now = time.monotonic()
+        with self._lock:
+            buckets = list(self._buckets.items())
+        for key, bucket in buckets:
+            with self._lock:
+                unsynced, bucket.unsynced = bucket.unsynced, 0
+            try:
+                if unsynced:
+                    cache.add(key, 0, SHARED_COUNTER_TIMEOUT)
+                    total = cache.incr(key, unsynced)
+                else:
+                    total = cache.get(key, 0)
+            except ValueError:
+                cache.set(key, unsynced, SHARED_COUNTER_TIMEOUT)
+                total = unsynced
+            with self._lock:
+                if bucket.shared_total is not None:
+                    others = total - bucket.shared_total - unsynced
+                    bucket.refill(now)
+                    bucket.tokens = max(0, bucket.tokens - max(0, others))
+                bucket.shared_total = total
+                if bucket.is_idle(now) and self._buckets.get(key) is bucket:
+                    del self._buckets[key]
+
+
+buckets = BucketRegistry()
+
+
+class TokenBucketThrottle(ScopedRateThrottle):
+    """
+    Лимит запросов на запись по throttle_scope представления. Ставка из
+    DEFAULT_THROTTLE_RATES, например '60/min', задает и размер корзины
+    (допустимый всплеск), и скорость ее пополнения
+    """
+
+    def allow_request(self, request, view):
+        if request.method in SAFE_METHODS or getattr(request, 'shed_by_load', False):
+            return True
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        allowed, self.retry_after = buckets.consume(
+            self.get_cache_key(request, view),
+            self.num_requests,
+            self.num_requests / self.duration
+        )
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+class DatabaseLatency:
+    """Сглаженная задержка БД, замеряется не чаще раза в DB_LATENCY_PROBE_INTERVAL"""
+
+    def __init__(self, smoothing=0.3):
+        self.smoothing = smoothing
+        self.value = 0.0
+        self._measured_at = None
+        self._lock = threading.Lock()
+
+    def probe(self):
+        started = time.monotonic()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        return time.monotonic() - started
+
+    def get(self):
+        now = time.monotonic()
+        with self._lock:
+            due = (self._measured_at is None or
+                   now - self._measured_at >= settings.DB_LATENCY_PROBE_INTERVAL)
+            if due:
+                self._measured_at = now
+        if due:
+            sample = self.probe()
+            with self._lock:
+                self.value += self.smoothing * (sample - self.value)
+        return self.value
+
+
+db_latency = DatabaseLatency()
+
+
+class DatabaseLoadThrottle(BaseThrottle):
+    """Отклоняет запросы на запись, пока БД отвечает медленнее порога"""
+
+    def allow_request(self, request, view):
+        if request.method in SAFE_METHODS:
+            return True
+        if db_latency.get() <= settings.DB_LATENCY_THRESHOLD:
+            return True
+        request.shed_by_load = True
+        return False
+
+    def wait(self):
+        return settings.DB_LATENCY_RETRY_AFTER
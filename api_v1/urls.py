@@ -1,14 +1,29 @@
-from django.urls import path, include
+from importlib import import_module
+
+from django.urls import path, re_path
 from .views import (ProductViewSet, CategoryViewSet, SupplierViewSet,
-                    SingleCategoryView, DeliveryViewSet, HelloView,
-                    UserListView, OrderViewSet, BuyerViewSet)
-from .yasg import urlpatterns as swagger_urls
+                    DeliveryViewSet, HelloView,
+                    UserListView, OrderViewSet, BuyerViewSet,
+                    StockAlertViewSet, ReplenishmentSuggestionViewSet,
+                    WarehouseViewSet, DeletionJobViewSet,
+                    StockAuditEventViewSet)
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt import views as jwt_views
 
 
 app_name = "api_v1"
 
+
+def lazy_view(name):
+    """
+    Представление из api_v1.yasg, модуль импортируется при первом запросе:
+    drf_yasg с ruamel.yaml не нужны воркеру, пока не открыта документация
+    """
+    def view(request, *args, **kwargs):
+        return getattr(import_module('api_v1.yasg'), name)(request, *args, **kwargs)
+    return view
+
+
 router = DefaultRouter()
 router.register('products', ProductViewSet, basename='product')
 router.register('deliveries', DeliveryViewSet, basename='delivery')
@@ -16,6 +31,12 @@ router.register('orders', OrderViewSet, basename='order')
 router.register('buyers', BuyerViewSet, basename='buyer')
 router.register('categories', CategoryViewSet, basename='category')
 router.register('suppliers', SupplierViewSet, basename='supplier')
+router.register('stock-alerts', StockAlertViewSet, basename='stock-alert')
+router.register('replenishment', ReplenishmentSuggestionViewSet,
+                basename='replenishment')
+router.register('warehouses', WarehouseViewSet, basename='warehouse')
+router.register('deletion-jobs', DeletionJobViewSet, basename='deletion-job')
+router.register('stock-audit', StockAuditEventViewSet, basename='stock-audit')
 
 urlpatterns = [
     path('token/',
@@ -28,5 +49,9 @@ urlpatterns = [
     path('users/', UserListView.as_view(), name='users'),
 ]
 
-urlpatterns += swagger_urls
+urlpatterns += [
+    re_path(r'^swagger(?P<format>\.json|\.yaml)$', lazy_view('schema'), name='schema-json'),
+    path('swagger/', lazy_view('swagger_ui'), name='schema-swagger-ui'),
+    path('redoc/', lazy_view('redoc'), name='schema-redoc'),
+]
 urlpatterns += router.urls
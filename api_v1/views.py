@@ -1,18 +1,68 @@
+import binascii
+import heapq
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, time
+from itertools import islice
+from operator import attrgetter
+
 from rest_framework import viewsets
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.views import APIView
+from rest_framework.settings import api_settings
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.generics import (get_object_or_404, RetrieveUpdateDestroyAPIView,
                                      ListCreateAPIView)
 from rest_framework.permissions import (IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
-from .models import Product, Category, Supplier, Delivery, User, Order, Buyer
+from .models import (Product, Category, Supplier, Delivery, User, Order, Buyer,
+                     StockAlert, ReplenishmentSuggestion, Warehouse,
+                     ArchivedOrder, ArchivedDelivery, DeletionJob,
+                     StockAuditEvent)
 from .serializers import (ProductSerializer, CategorySerializer,
                           CategoryCreateSerializer,
                           SupplierSerializer, DeliverySerializer,
                           UserSerializer, OrderSerializer, BuyerSerializer,
-                          BuyerDetailSerializer, SupplierDetailSerializer)
-from django.db.models import Count, Sum, F
+                          BuyerDetailSerializer, SupplierDetailSerializer,
+                          StockAlertSerializer,
+                          ReplenishmentSuggestionSerializer,
+                          WarehouseSerializer, WarehouseStockSerializer,
+                          ArchivedOrderSerializer, ArchivedDeliverySerializer,
+                          DeletionJobSerializer, StockAuditEventSerializer,
+                          StockAdjustmentSerializer)
+from .deletion import has_history, start_deletion
+from .throttling import DatabaseLoadThrottle, TokenBucketThrottle
+from .picking import preview_wave, fulfil_wave, PickListTextRenderer
+from .stock import adjust_stock
+from .suppliers import supplier_index, suppliers_for
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum, F, Prefetch, Min, Max, prefetch_related_objects
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+# Верхняя граница id (AutoField), большие значения не доходят до БД
+MAX_PK = 2 ** 31 - 1
+
+
+class PkRangeMixin:
+    """
+    Mixin для ViewSet: id больше MAX_PK дает 404, а не ошибку
+    переполнения целого в БД
+    """
+
+    def get_object(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            if int(self.kwargs[lookup_url_kwarg]) > MAX_PK:
+                raise NotFound()
+        except ValueError:
+            pass
+        return super().get_object()
 
 
 class MultipeSerializersViewSetMixin:
@@ -25,17 +75,225 @@ class MultipeSerializersViewSetMixin:
         return self.action_serializers.get(self.action, self.serializer_class)
 
 
-class SupplierViewSet(MultipeSerializersViewSetMixin, viewsets.ModelViewSet):
+class CreatedRangeMixin:
+    """
+    Mixin для фильтра списков по дате создания в GET-параметрах
+    created_after и created_before
+    """
+
+    def get_created_range(self):
+        bounds = []
+        for name in ('created_after', 'created_before'):
+            value = self.request.query_params.get(name)
+            parsed = None
+            if value:
+                try:
+                    parsed = parse_datetime(value)
+                    if parsed is None and parse_date(value) is not None:
+                        parsed = datetime.combine(parse_date(value), time.min)
+                except ValueError:
+                    pass
+                if parsed is None:
+                    raise ValidationError({name: 'Enter a valid date or date/time.'})
+                if timezone.is_naive(parsed):
+                    parsed = timezone.make_aware(parsed)
+            bounds.append(parsed)
+        return bounds
+
+    @staticmethod
+    def filter_created(queryset, created_after, created_before):
+        if created_after is not None:
+            queryset = queryset.filter(created_at__gte=created_after)
+        if created_before is not None:
+            queryset = queryset.filter(created_at__lt=created_before)
+        return queryset
+
+
+class ArchiveRangeMixin(CreatedRangeMixin):
+    """
+    Mixin для списков заказов и поставок с фильтром по дате создания
+    в GET-параметрах created_after и created_before. Архивные таблицы
+    читаются, только если задан диапазон и он пересекается с датами
+    архивных записей. Такой список отдается страницами по
+    ARCHIVE_LIST_PAGE_SIZE записей по возрастанию (created_at, id):
+    {"next": ссылка на следующую страницу или null, "results": [...]}.
+    Страница собирается слиянием не больше page_size + 1 записей из
+    каждой таблицы, курсор - ключ последней записи страницы.
+    """
+    archive_model = None
+    archive_serializer_class = None
+    cursor_query_param = 'cursor'
+
+    def list(self, request, *args, **kwargs):
+        created_after, created_before = self.get_created_range()
+        queryset = self.filter_created(
+            self.filter_queryset(self.get_queryset()), created_after, created_before
+        )
+        if not self.overlaps_archive(created_after, created_before):
+            return Response(self.get_serializer(queryset, many=True).data)
+
+        archived = self.filter_created(
+            self.archive_model.objects.all(), created_after, created_before
+        )
+        page_size = settings.ARCHIVE_LIST_PAGE_SIZE
+        after = self.decode_cursor()
+        records = list(islice(heapq.merge(
+            self.page(queryset, after, page_size + 1),
+            self.page(archived, after, page_size + 1),
+            key=attrgetter('created_at', 'id')
+        ), page_size + 1))
+
+        next_url = None
+        if len(records) > page_size:
+            records = records[:page_size]
+            next_url = replace_query_param(
+                request.build_absolute_uri(), self.cursor_query_param,
+                self.encode_cursor(records[-1])
+            )
+        # Позиции загружаются и записи сериализуются только для попавших
+        # на страницу, по одному запросу и сериализатору на таблицу
+        results = {}
+        for serializer_class, is_archived in ((self.get_serializer, False),
+                                              (self.archive_serializer_class, True)):
+            part = [record for record in records
+                    if isinstance(record, self.archive_model) == is_archived]
+            prefetch_related_objects(part, 'items')
+            for record, data in zip(part, serializer_class(part, many=True).data):
+                results[id(record)] = data
+        return Response({
+            'next': next_url,
+            'results': [results[id(record)] for record in records],
+        })
+
+    def overlaps_archive(self, created_after, created_before):
+        """
+        Пересекается ли диапазон с датами архивных записей. Границы
+        берутся из самого архива, а не из ARCHIVE_HORIZON_DAYS: архивация
+        могла идти с другим горизонтом (archive_records --days)
+        """
+        if created_after is None and created_before is None:
+            return False
+        bounds = self.archive_model.objects.aggregate(
+            first=Min('created_at'), last=Max('created_at')
+        )
+        if bounds['first'] is None:
+            return False
+        return ((created_after is None or created_after <= bounds['last']) and
+                (created_before is None or created_before > bounds['first']))
+
+    @staticmethod
+    def page(queryset, after, size):
+        """Первые size записей с ключом (created_at, id) больше after"""
+        queryset = queryset.prefetch_related(None).order_by('created_at', 'id')
+        if after is not None:
+            created_at, pk = after
+            queryset = (queryset.filter(created_at__gte=created_at)
+                        .exclude(created_at=created_at, id__lte=pk))
+        return list(queryset[:size])
+
+    @staticmethod
+    def encode_cursor(record):
+        value = f'{record.created_at.isoformat()}|{record.id}'
+        return urlsafe_b64encode(value.encode()).decode()
+
+    def decode_cursor(self):
+        value = self.request.query_params.get(self.cursor_query_param)
+        if not value:
+            return None
+        try:
+            created_at, pk = urlsafe_b64decode(value.encode()).decode().split('|')
+            created_at = parse_datetime(created_at)
+            pk = int(pk)
+        except (ValueError, UnicodeDecodeError, binascii.Error):
+            created_at = None
+        if created_at is None:
+            raise ValidationError({self.cursor_query_param: 'Invalid cursor.'})
+        return created_at, pk
+
+
+class ChunkedDestroyMixin:
+    """
+    Mixin для удаления категорий и поставщиков фоновой задачей пакетного
+    удаления (api_v1.deletion) вместо одной большой каскадной транзакции.
+
+    GET-параметр on_history задает поведение, если у объекта есть
+    история заказов или поставок: refuse - отказать с 409, soft - только
+    пометить удаленным, delete - удалить вместе с историей.
+    """
+    HISTORY_POLICIES = ('refuse', 'soft', 'delete')
+
+    def destroy(self, request, *args, **kwargs):
+        instance = self.get_object()
+        policy = request.query_params.get(
+            'on_history', settings.DELETION_HISTORY_POLICY
+        )
+        if policy not in self.HISTORY_POLICIES:
+            raise ValidationError({
+                'on_history': f'Must be one of: {", ".join(self.HISTORY_POLICIES)}'
+            })
+        if policy != 'delete' and has_history(instance):
+            if policy == 'refuse':
+                return Response(
+                    {'detail': f'{instance} is referenced by order or delivery '
+                               f'history, use on_history=soft or on_history=delete'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            with transaction.atomic():
+                instance.is_deleted = True
+                instance.save(update_fields=('is_deleted',))
+                transaction.on_commit(supplier_index.invalidate)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        job = start_deletion(instance)
+        return Response(
+            DeletionJobSerializer(job).data, status=status.HTTP_202_ACCEPTED
+        )
+
+
+class SupplierViewSet(PkRangeMixin, ChunkedDestroyMixin,
+                      MultipeSerializersViewSetMixin, viewsets.ModelViewSet):
     """ViewSet для отображения поставщиков"""
-    queryset = Supplier.objects.all()
+    queryset = Supplier.objects.filter(is_deleted=False)
     serializer_class = SupplierSerializer
 
     action_serializers = {
         'retrieve': SupplierDetailSerializer,
     }
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'retrieve':
+            return queryset.prefetch_related(
+                Prefetch('product_category',
+                         queryset=Category.objects.filter(is_deleted=False).only('id', 'name')),
+                Prefetch('deliveries',
+                         queryset=Delivery.objects.only('id', 'created_at', 'supplier_id'))
+            )
+        return queryset
 
-class BuyerViewSet(viewsets.ModelViewSet):
+    @action(detail=False, url_path='for-products')
+    def for_products(self, request):
+        """
+        Поставщики, которые могут привезти товары из GET-параметра
+        products (id через запятую), по каждому товару
+        """
+        value = request.query_params.get('products', '')
+        try:
+            product_ids = [int(product_id) for product_id in value.split(',') if product_id]
+        except ValueError:
+            raise ValidationError({'products': 'Must be a comma-separated list of ids'})
+        if not product_ids:
+            raise ValidationError({'products': 'This parameter is required'})
+        return Response([
+            {
+                'product': product_id,
+                'suppliers': [{'id': supplier_id, 'name': name}
+                              for supplier_id, name in suppliers],
+            }
+            for product_id, suppliers in suppliers_for(product_ids).items()
+        ])
+
+
+class BuyerViewSet(PkRangeMixin, viewsets.ModelViewSet):
     """ViewSet для отображения покупателей"""
     queryset = Buyer.objects.all()
     serializer_class = BuyerSerializer
@@ -47,14 +305,36 @@ class BuyerViewSet(viewsets.ModelViewSet):
     def get_serializer_class(self):
         return self.action_serializers.get(self.action, self.serializer_class)
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'retrieve':
+            return queryset.prefetch_related('orders__items')
+        return queryset
 
-class ProductViewSet(viewsets.ModelViewSet):
+
+class ProductViewSet(PkRangeMixin, viewsets.ModelViewSet):
     """ ViewSet для отображения товаров"""
-    queryset = Product.objects.all()
+    queryset = Product.objects.filter(category__is_deleted=False)
     serializer_class = ProductSerializer
 
+    @action(detail=True, methods=['post'], url_path='adjust-stock',
+            serializer_class=StockAdjustmentSerializer)
+    def adjust_stock(self, request, pk=None):
+        """
+        Корректирует остаток товара на delta единиц, на складе warehouse
+        или в остатке без склада
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        product = adjust_stock(
+            self.get_object(), serializer.validated_data['delta'],
+            serializer.validated_data.get('warehouse'), request.user
+        )
+        return Response(ProductSerializer(product).data)
+
 
-class CategoryViewSet(MultipeSerializersViewSetMixin, viewsets.ModelViewSet):
+class CategoryViewSet(ChunkedDestroyMixin, MultipeSerializersViewSetMixin,
+                      viewsets.ModelViewSet):
     """ViewSet для отображения категорий"""
     # queryset = Category.objects.all()
     serializer_class = CategorySerializer
@@ -67,28 +347,36 @@ class CategoryViewSet(MultipeSerializersViewSetMixin, viewsets.ModelViewSet):
         Возвращает queryset с аннотацией количеством товаров категории и
         суммой стоимости товаров в категории
         """
-        return Category.objects.annotate(
+        return Category.objects.filter(is_deleted=False).annotate(
             number_of_products=Count('products'),
             total_items=Sum('products__quantity'),
             total_value=Sum(F('products__quantity') * F('products__price'))
         )
 
 
-class SingleCategoryView(RetrieveUpdateDestroyAPIView):
-    queryset = Category.objects.all()
+class SingleCategoryView(ChunkedDestroyMixin, RetrieveUpdateDestroyAPIView):
+    queryset = Category.objects.filter(is_deleted=False)
     serializer_class = CategorySerializer
 
 
-class DeliveryViewSet(viewsets.ModelViewSet):
+class DeliveryViewSet(ArchiveRangeMixin, viewsets.ModelViewSet):
     """Тестовый ViewSet для отображения поставки"""
-    queryset = Delivery.objects.all()
+    queryset = Delivery.objects.prefetch_related('items')
     serializer_class = DeliverySerializer
+    throttle_classes = (DatabaseLoadThrottle, TokenBucketThrottle)
+    throttle_scope = 'deliveries'
+    archive_model = ArchivedDelivery
+    archive_serializer_class = ArchivedDeliverySerializer
 
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(ArchiveRangeMixin, viewsets.ModelViewSet):
     """ViewSet для отображения заказа"""
-    queryset = Order.objects.all()
+    queryset = Order.objects.prefetch_related('items')
     serializer_class = OrderSerializer
+    throttle_classes = (DatabaseLoadThrottle, TokenBucketThrottle)
+    throttle_scope = 'orders'
+    archive_model = ArchivedOrder
+    archive_serializer_class = ArchivedOrderSerializer
 
     @action(detail=False)
     def recent_orders(self, request):
@@ -98,15 +386,117 @@ class OrderViewSet(viewsets.ModelViewSet):
         """
         orders_limit = self.request.query_params.get('limit', '10')
         try:
-            orders_limit = int(orders_limit)
+            orders_limit = max(int(orders_limit), 0)
         except ValueError:
             orders_limit = 10
         recent_orders = (
-            Order.objects.all().order_by('-created_at')[:orders_limit]
+            Order.objects.prefetch_related('items')
+            .order_by('-created_at')[:orders_limit]
         )
         serializer = self.get_serializer(recent_orders, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get', 'post'],
+            renderer_classes=api_settings.DEFAULT_RENDERER_CLASSES + [PickListTextRenderer])
+    def pick_list(self, request):
+        """
+        Листы подбора для волны из самых старых активных заказов, размер
+        волны - GET-параметр size (по умолчанию 500). GET показывает
+        следующую волну, POST формирует ее и помечает заказы выполненными.
+        С format=txt листы отдаются в текстовом виде для печати.
+        """
+        try:
+            size = int(request.query_params.get('size', 500))
+        except ValueError:
+            raise ValidationError({'size': 'Must be an integer'})
+        if not 0 < size <= settings.PICK_WAVE_MAX_SIZE:
+            raise ValidationError(
+                {'size': f'Must be between 1 and {settings.PICK_WAVE_MAX_SIZE}'}
+            )
+        if request.method == 'POST':
+            return Response(fulfil_wave(size))
+        return Response(preview_wave(size))
+
+
+class StockAlertViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    ViewSet для уведомлений о низком остатке. По умолчанию показывает
+    открытые уведомления, с GET-параметром resolved=1 - закрытые.
+    """
+    serializer_class = StockAlertSerializer
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return StockAlert.objects.none()
+        resolved = self.request.query_params.get('resolved') == '1'
+        return StockAlert.objects.filter(
+            resolved_at__isnull=not resolved
+        ).order_by('-created_at')
+
+
+class ReplenishmentSuggestionViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    ViewSet для рекомендаций по дозаказу, рассчитываются командой
+    forecast_replenishment. С GET-параметром all=1 показывает и товары,
+    которые дозаказывать не нужно.
+    """
+    serializer_class = ReplenishmentSuggestionSerializer
+
+    def get_queryset(self):
+        queryset = ReplenishmentSuggestion.objects.order_by('-suggested_quantity')
+        if getattr(self, 'swagger_fake_view', False):
+            return queryset
+        if self.request.query_params.get('all') != '1':
+            queryset = queryset.filter(suggested_quantity__gt=0)
+        return queryset
+
+
+class WarehouseViewSet(viewsets.ModelViewSet):
+    """ViewSet для отображения складов"""
+    queryset = Warehouse.objects.all()
+    serializer_class = WarehouseSerializer
+
+    @action(detail=True)
+    def stock(self, request, pk=None):
+        """Показывает ненулевые остатки товаров на складе"""
+        warehouse = self.get_object()
+        stock = warehouse.stock.filter(quantity__gt=0).order_by('product_id')
+        serializer = WarehouseStockSerializer(stock, many=True)
+        return Response(serializer.data)
+
+
+class DeletionJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """ViewSet для отслеживания фоновых задач удаления"""
+    queryset = DeletionJob.objects.order_by('-created_at')
+    serializer_class = DeletionJobSerializer
+
+
+class AuditPagination(CursorPagination):
+    ordering = '-created_at'
+    page_size = 100
+
+
+class StockAuditEventViewSet(CreatedRangeMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    ViewSet для журнала аудита остатков с фильтрами по GET-параметрам
+    product, user, created_after и created_before
+    """
+    queryset = StockAuditEvent.objects.all()
+    serializer_class = StockAuditEventSerializer
+    pagination_class = AuditPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if getattr(self, 'swagger_fake_view', False):
+            return queryset
+        for name in ('product', 'user'):
+            value = self.request.query_params.get(name)
+            if value:
+                if not value.isdigit():
+                    raise ValidationError({name: 'Must be an integer'})
+                queryset = queryset.filter(**{f'{name}_id': value})
+        return self.filter_created(queryset, *self.get_created_range())
+
 
 class HelloView(APIView):
     permission_classes = (IsAuthenticated,)
@@ -1,23 +1,172 @@
-from django.urls import path, re_path
+import glob
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import django
+import drf_yasg
+import rest_framework
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
+from drf_yasg.codecs import yaml_sane_dump
 from drf_yasg import openapi
+from stms_v1.middleware import accepted_encodings
 
 ...
 
+schema_info = openapi.Info(
+   title="STMS API",
+   default_version='v1',
+   description="Test description",
+   license=openapi.License(name="BSD License"),
+)
+
 schema_view = get_schema_view(
-   openapi.Info(
-      title="STMS API",
-      default_version='v1',
-      description="Test description",
-      license=openapi.License(name="BSD License"),
-   ),
+   schema_info,
    public=True,
    permission_classes=(permissions.AllowAny,),
 )
 
-urlpatterns = [
-   re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_view.without_ui(cache_timeout=0), name='schema-json'),
-   path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-   path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
-]
\ No newline at end of file
+VERSION_KEY = 'x-code-version'
+
+
+# Пакеты проекта, от исходников которых зависит схема
+SOURCE_PACKAGES = ('api_v1', 'stms_v1')
+
+
+def code_version():
+    """
+    Версия кода для проверки актуальности схемы: переменная окружения
+    STMS_CODE_VERSION, а если ее нет - отпечаток исходников пакетов
+    проекта (представления, сериализаторы, настройки, маршруты) и версий
+    библиотек, которые строят схему
+    """
+    version = os.environ.get('STMS_CODE_VERSION')
+    if version:
+        return version
+    digest = hashlib.sha1()
+    for package in (django, rest_framework, drf_yasg):
+        digest.update(f'{package.__name__}:{package.__version__}'.encode())
+    for package in SOURCE_PACKAGES:
+        names = glob.glob(os.path.join(settings.BASE_DIR, package, '**', '*.py'),
+                          recursive=True)
+        for name in sorted(names):
+            stat = os.stat(name)
+            digest.update(f'{name}:{stat.st_mtime_ns}:{stat.st_size}'.encode())
+    return digest.hexdigest()
+
+
+def generate_schema():
+    """Строит OpenAPI-схему по всем ViewSet'ам и сериализаторам"""
+    generator = schema_view.generator_class(schema_info)
+    schema = generator.get_schema(request=None, public=True)
+    spec = json.loads(json.dumps(schema.as_odict()), object_pairs_hook=OrderedDict)
+    spec[VERSION_KEY] = code_version()
+    return spec
+
+
+def write_schema(spec, filename=None):
+    """
+    Атомарно записывает схему в файл. Временный файл уникален, поэтому
+    воркеры, одновременно генерирующие схему, не пишут в один файл
+    """
+    filename = filename or settings.SCHEMA_CACHE_FILE
+    directory, name = os.path.split(os.path.abspath(filename))
+    with tempfile.NamedTemporaryFile('w', dir=directory, prefix=f'{name}.',
+                                     suffix='.tmp', delete=False) as schema_file:
+        try:
+            json.dump(spec, schema_file)
+        except BaseException:
+            schema_file.close()
+            os.remove(schema_file.name)
+            raise
+    os.replace(schema_file.name, filename)
+
+
+class CachedSchema:
+    """
+    OpenAPI-схема, сгенерированная один раз на версию кода.
+
+    Схема берется из файла SCHEMA_CACHE_FILE (его пишет команда
+    generate_schema при деплое), а если файла нет или он от другой
+    версии кода - генерируется при первом запросе и записывается в файл.
+    Схема и готовые тела ответов с их gzip-версиями живут в памяти
+    до перезапуска процесса.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spec = None
+        self._bodies = {}
+
+    def _load(self):
+        if self._spec is not None:
+            return
+        version = code_version()
+        spec = None
+        try:
+            with open(settings.SCHEMA_CACHE_FILE) as schema_file:
+                spec = json.load(schema_file, object_pairs_hook=OrderedDict)
+        except (OSError, ValueError):
+            pass
+        if spec is None or spec.get(VERSION_KEY) != version:
+            spec = generate_schema()
+            try:
+                write_schema(spec)
+            except OSError:
+                pass
+        self._spec = spec
+
+    def get(self, format):
+        """
+        Возвращает тело схемы в формате json или yaml, его gzip и ETag.
+        У gzip-версии свой ETag с суффиксом -gzip
+        """
+        with self._lock:
+            self._load()
+            if format not in self._bodies:
+                if format == 'yaml':
+                    body = yaml_sane_dump(self._spec, binary=True)
+                else:
+                    body = json.dumps(self._spec).encode()
+                etag = hashlib.sha1(body).hexdigest()
+                self._bodies[format] = (body, gzip.compress(body), etag)
+            return self._bodies[format]
+
+
+cached_schema = CachedSchema()
+
+CONTENT_TYPES = {
+    'json': 'application/json',
+    'yaml': 'application/yaml',
+}
+
+
+def schema(request, format):
+    """Отдает закэшированную схему с ETag и gzip"""
+    format = format.lstrip('.')
+    body, gzipped, etag = cached_schema.get(format)
+    if 'gzip' in accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+        body, etag, encoding = gzipped, f'"{etag}-gzip"', 'gzip'
+    else:
+        etag, encoding = f'"{etag}"', None
+    if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type=CONTENT_TYPES[format])
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Vary'] = 'Accept-Encoding'
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+swagger_ui = schema_view.with_ui('swagger', cache_timeout=0)
+redoc = schema_view.with_ui('redoc', cache_timeout=0)
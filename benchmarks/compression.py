@@ -0,0 +1,105 @@
+"""
+Сравнение уровней сжатия gzip и brotli на телах ответов API: степень
+сжатия, время сжатия (CPU сервера) и время передачи по медленному каналу.
+
+Тела берутся с работающего сервера, например:
+
+    python benchmarks/compression.py http://127.0.0.1:8000 \\
+        --path /api/buyers/1/ --path /api/products/ --token <JWT> --bandwidth 256
+
+Без url сжимается синтетическая карточка покупателя с историей заказов.
+Brotli замеряется, только если установлен пакет brotli.
+"""
+import argparse
+import gzip
+import json
+import random
+import time
+import urllib.request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVELS = (1, 3, 6, 9)
+BROTLI_QUALITIES = (1, 4, 6, 9, 11)
+
+
+def synthetic_body(orders=2000):
+    """Тело, похожее на BuyerDetailSerializer с длинной историей заказов"""
+    rng = random.Random(0)
+    return json.dumps({
+        'id': 1,
+        'full_name': 'Иванов Иван Иванович',
+        'contact_person': 'Иванов Иван',
+        'phone_number': '+74951234567',
+        'email': 'buyer@example.com',
+        'orders': [
+            {
+                'id': order_id,
+                'created_at': f'2020-09-{rng.randint(1, 30):02d}T12:{rng.randint(0, 59):02d}:00Z',
+                'status': 'active',
+                'items': [
+                    {'product': rng.randint(1, 5000), 'warehouse': rng.randint(1, 20),
+                     'quantity': rng.randint(1, 50)}
+                    for _ in range(rng.randint(1, 8))
+                ],
+            }
+            for order_id in range(1, orders + 1)
+        ],
+    }, ensure_ascii=False).encode()
+
+
+def fetch(url, token=None):
+    request = urllib.request.Request(url, headers={'Accept-Encoding': 'identity'})
+    if token:
+        request.add_header('Authorization', f'Bearer {token}')
+    with urllib.request.urlopen(request) as response:
+        return response.read()
+
+
+def measure(name, compress, body, repeat, bandwidth):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        compressed = compress(body)
+    elapsed = (time.perf_counter() - started) / repeat
+    transfer = len(compressed) / (bandwidth * 1024 / 8)
+    print(f'  {name:<12} {len(compressed):>10} {len(body) / len(compressed):>7.1f}x '
+          f'{elapsed * 1000:>9.2f} ms {transfer * 1000:>10.0f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('url', nargs='?')
+    parser.add_argument('--path', action='append', dest='paths')
+    parser.add_argument('--token', help='JWT access token')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--bandwidth', type=float, default=512,
+                        help='скорость канала клиента, кбит/с')
+    args = parser.parse_args()
+
+    if args.url:
+        bodies = [
+            (path, fetch(args.url.rstrip('/') + path, args.token))
+            for path in args.paths or ('/api/products/',)
+        ]
+    else:
+        bodies = [('synthetic buyer', synthetic_body())]
+
+    for name, body in bodies:
+        transfer = len(body) / (args.bandwidth * 1024 / 8)
+        print(f'{name}: {len(body)} bytes, {transfer * 1000:.0f} ms uncompressed')
+        print(f'  {"encoding":<12} {"bytes":>10} {"ratio":>8} {"cpu":>12} {"transfer":>13}')
+        for level in GZIP_LEVELS:
+            measure(f'gzip-{level}', lambda data: gzip.compress(data, level),
+                    body, args.repeat, args.bandwidth)
+        if brotli is not None:
+            for quality in BROTLI_QUALITIES:
+                measure(f'br-{quality}', lambda data: brotli.compress(data, quality=quality),
+                        body, args.repeat, args.bandwidth)
+        print()
+
+
+if __name__ == '__main__':
+    main()
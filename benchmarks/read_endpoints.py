@@ -0,0 +1,138 @@
+"""
+Нагрузочный тест read-эндпоинтов: запросы в секунду, задержки и память
+сервера при большом числе одновременных клиентов.
+
+Сервер запускается отдельно, например:
+
+    gunicorn stms_v1.wsgi -w 4                      # WSGI
+    uvicorn stms_v1.asgi:application --workers 4    # ASGI
+
+    python benchmarks/read_endpoints.py http://127.0.0.1:8000 \\
+        --concurrency 200 --duration 30 --pid <pid мастера>
+
+Результаты на 1 CPU, SQLite, settings_prod, seed_data --scale small
+(1000 товаров в /api/products/), 2 воркера, --concurrency 50 --duration 15:
+
+    сервер                          req/s   p50, мс   p99, мс   RSS пик, MiB
+    gunicorn, WSGI                   51.2       805      2592          229
+    uvicorn, ASGI, синхронный стек   41.9       806      3653          254
+    uvicorn, ASGI, async_views       45.1       416      5019          244
+
+Строка async_views - прежние отдельные ASGI-обработчики read-эндпоинтов
+в обход стека Django. Они были быстрее синхронного стека под ASGI
+примерно на 8% и вдвое по медиане задержки, но с одним CPU упирались
+в процессор, не обгоняли gunicorn и повторяли запросы ViewSet'ов
+с расхождениями, поэтому удалены: read-эндпоинты под ASGI обслуживает
+обычный стек, а выигрыш ASGI проявляется на простаивающих соединениях
+(лента изменений остатков), а не на сериализации.
+"""
+import argparse
+import http.client
+import os
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+ENDPOINTS = (
+    '/api/products/',
+    '/api/products/1/',
+    '/api/categories/',
+    '/api/orders/recent_orders/',
+    '/api/buyers/1/',
+    '/api/suppliers/1/',
+)
+
+
+def rss_kb(pid):
+    """Суммарный RSS процесса и всех его потомков в килобайтах"""
+    pids = [pid]
+    for child in os.listdir('/proc'):
+        if not child.isdigit():
+            continue
+        try:
+            with open(f'/proc/{child}/stat') as stat:
+                ppid = int(stat.read().rsplit(')', 1)[1].split()[1])
+        except OSError:
+            continue
+        if ppid == pid:
+            pids.append(int(child))
+    total = 0
+    for item in pids:
+        try:
+            with open(f'/proc/{item}/status') as status:
+                for line in status:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+        except OSError:
+            pass
+    return total
+
+
+def worker(host, port, paths, deadline, latencies, errors):
+    connection = http.client.HTTPConnection(host, port, timeout=30)
+    index = 0
+    while time.monotonic() < deadline:
+        path = paths[index % len(paths)]
+        index += 1
+        started = time.monotonic()
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 400:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException) as exc:
+            errors.append(type(exc).__name__)
+            connection.close()
+            connection = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        latencies.append(time.monotonic() - started)
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('url')
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--pid', type=int, help='pid сервера для замера RSS')
+    parser.add_argument('--path', action='append', dest='paths')
+    args = parser.parse_args()
+
+    url = urlsplit(args.url)
+    paths = args.paths or ENDPOINTS
+    latencies, errors = [], []
+    deadline = time.monotonic() + args.duration
+    threads = [
+        threading.Thread(
+            target=worker,
+            args=(url.hostname, url.port or 80, paths, deadline, latencies, errors),
+        )
+        for _ in range(args.concurrency)
+    ]
+    rss_before = rss_kb(args.pid) if args.pid else None
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    rss_peak = rss_before
+    while any(thread.is_alive() for thread in threads):
+        time.sleep(0.5)
+        if args.pid:
+            rss_peak = max(rss_peak, rss_kb(args.pid))
+    elapsed = time.monotonic() - started
+
+    print(f'requests:     {len(latencies)}')
+    print(f'errors:       {len(errors)}')
+    print(f'requests/sec: {len(latencies) / elapsed:.1f}')
+    if latencies:
+        quantiles = statistics.quantiles(latencies, n=100)
+        print(f'latency p50:  {quantiles[49] * 1000:.1f} ms')
+        print(f'latency p99:  {quantiles[98] * 1000:.1f} ms')
+    if args.pid:
+        print(f'rss before:   {rss_before / 1024:.1f} MiB')
+        print(f'rss peak:     {rss_peak / 1024:.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
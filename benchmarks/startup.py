@@ -0,0 +1,88 @@
+"""
+Время холодного старта воркера: импорт приложения и URLconf, память
+процесса и число загруженных модулей для разных модулей настроек.
+
+Каждый замер выполняется в отдельном интерпретаторе:
+
+    STMS_SECRET_KEY=x python benchmarks/startup.py --runs 5 --importtime 15
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SETTINGS = ('stms_v1.settings', 'stms_v1.settings_prod')
+
+WATCHED = ('drf_yasg', 'ruamel.yaml', 'django_extensions', 'coreapi', 'pkg_resources')
+
+BOOT = '''
+import json, sys, time
+started = time.perf_counter()
+from stms_v1.wsgi import application
+from django.urls import get_resolver
+get_resolver().url_patterns
+elapsed = time.perf_counter() - started
+rss = 0
+with open('/proc/self/status') as status:
+    for line in status:
+        if line.startswith('VmRSS:'):
+            rss = int(line.split()[1])
+print(json.dumps({
+    'seconds': elapsed,
+    'rss_kb': rss,
+    'modules': len(sys.modules),
+    'loaded': [name for name in %r if name in sys.modules],
+}))
+''' % (WATCHED,)
+
+
+def boot(settings, importtime=False):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings, PYTHONPATH=ROOT)
+    env.setdefault('STMS_SECRET_KEY', 'startup-benchmark')
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    result = subprocess.run(command + ['-c', BOOT], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout), result.stderr
+
+
+def slowest_imports(stderr, count):
+    """Модули с наибольшим накопленным временем импорта по -X importtime"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--settings', action='append')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--importtime', type=int, default=0,
+                        help='показать N самых долгих импортов')
+    args = parser.parse_args()
+
+    for settings in args.settings or SETTINGS:
+        results = [boot(settings)[0] for _ in range(args.runs)]
+        last = results[-1]
+        print(settings)
+        print(f'  startup:  {statistics.median(r["seconds"] for r in results) * 1000:.0f} ms')
+        print(f'  rss:      {statistics.median(r["rss_kb"] for r in results) / 1024:.1f} MiB')
+        print(f'  modules:  {last["modules"]}')
+        print(f'  loaded:   {", ".join(last["loaded"]) or "-"}')
+        if args.importtime:
+            _, stderr = boot(settings, importtime=True)
+            for cumulative, name in slowest_imports(stderr, args.importtime):
+                print(f'  {cumulative / 1000:8.1f} ms  {name}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+Конфигурация gunicorn для production: gunicorn -c gunicorn.conf.py
+
+Приложение загружается в мастер-процессе до fork (preload_app), туда же
+заранее импортируются URLconf и все представления, после чего объекты
+замораживаются (gc.freeze), чтобы сборщик мусора не трогал их страницы
+памяти и воркеры делили их с мастером без копирования.
+
+Настройка wsgi_app появилась в gunicorn 20.1, в более старых версиях
+модуль приложения нужно передавать в командной строке.
+"""
+import gc
+import multiprocessing
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stms_v1.settings_prod')
+
+wsgi_app = 'stms_v1.wsgi:application'
+bind = os.environ.get('STMS_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('STMS_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+preload_app = True
+max_requests = int(os.environ.get('STMS_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+
+def when_ready(server):
+    """
+    Прогрев мастера перед запуском воркеров. Соединения с БД закрываются,
+    чтобы воркеры не унаследовали открытые в мастере сокеты
+    """
+    if not server.cfg.preload_app:
+        return
+    import phonenumbers
+    from django.urls import get_resolver
+    from django.db import connections
+    get_resolver().url_patterns
+    # Метаданные phonenumbers загружаются по регионам при первом разборе
+    # номера, российские загружаются заранее, чтобы не копировать их
+    # в каждый воркер
+    phonenumbers.PhoneMetadata.metadata_for_region('RU')
+    connections.close_all()
+    gc.freeze()
+
@@ -13,4 +13,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stms_v1.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Импортируется после настройки Django, так как использует модели
+from api_v1.async_urls import resolve  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http':
+        handler, kwargs = resolve(scope['path'], scope['method'])
+        if handler is not None:
+            return await handler(scope, receive, send, **kwargs)
+    return await django_application(scope, receive, send)
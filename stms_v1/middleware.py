@@ -0,0 +1,133 @@
+"""
+Сжатие ответов gzip или brotli по заголовку Accept-Encoding клиента.
+
+Brotli используется, только если установлен пакет brotli. Обычные ответы
+меньше COMPRESSION_MIN_SIZE байт не сжимаются. Потоковые ответы сжимаются
+по мере генерации: каждый чанк сжимается и сбрасывается в поток сразу,
+без буферизации всего тела. Обработчики ASGI, работающие в обход стека
+Django (api_v1.streams), выбирают компрессор через compressor_for.
+"""
+import re
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ACCEPT_ENCODING_RE = re.compile(r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?')
+
+
+def accepted_encodings(header):
+    """Кодировки из Accept-Encoding, разрешенные клиентом (q > 0)"""
+    encodings = set()
+    for part in header.split(','):
+        match = ACCEPT_ENCODING_RE.match(part)
+        if not match:
+            continue
+        encoding, quality = match.groups()
+        try:
+            if quality is not None and float(quality) <= 0:
+                continue
+        except ValueError:
+            continue
+        encodings.add(encoding.lower())
+    return encodings
+
+
+class GzipCompressor:
+    encoding = 'gzip'
+
+    def __init__(self):
+        self._compressor = zlib.compressobj(
+            settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+        )
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliCompressor:
+    encoding = 'br'
+
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+def compressor_for(accept_encoding):
+    """Класс компрессора по Accept-Encoding или None, если сжатие не принимается"""
+    encodings = accepted_encodings(accept_encoding)
+    if brotli is not None and 'br' in encodings:
+        return BrotliCompressor
+    if 'gzip' in encodings:
+        return GzipCompressor
+    return None
+
+
+def choose_compressor(request):
+    """Класс компрессора для запроса или None, если клиент не принимает сжатие"""
+    return compressor_for(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+
+
+def compress_sequence(compressor, sequence):
+    """Сжимает поток чанков, каждый чанк сразу отдается клиенту"""
+    for chunk in sequence:
+        if chunk:
+            yield compressor.compress(chunk) + compressor.flush()
+    yield compressor.finish()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Сжимает ответы, если клиент это поддерживает. Должен стоять в начале
+    MIDDLEWARE, до middleware, которые читают или меняют тело ответа
+    """
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding'):
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressor_class = choose_compressor(request)
+        if compressor_class is None:
+            return response
+
+        compressor = compressor_class()
+        if response.streaming:
+            response.streaming_content = compress_sequence(
+                compressor, response.streaming_content
+            )
+            del response['Content-Length']
+        else:
+            compressed = compressor.compress(response.content) + compressor.finish()
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(response.content))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = compressor.encoding
+        return response
@@ -42,11 +42,19 @@ INSTALLED_APPS = [
     'rest_framework',
     'drf_yasg',
     'phonenumber_field',
+]
+
+# Приложения только для разработки, в settings_prod не подключаются
+DEV_APPS = [
     'django_extensions',
 ]
 
+if DEBUG:
+    INSTALLED_APPS += DEV_APPS
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'stms_v1.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -86,6 +94,17 @@ DATABASES = {
     }
 }
 
+# Кэш, общий для всех процессов: через него воркеры узнают о сбросе
+# индекса поставщиков (api_v1.suppliers) и делят расход лимитов записи
+# (api_v1.throttling). Таблица кэша создается командой
+# manage.py createcachetable
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'stms_cache',
+    }
+}
+
 AUTH_USER_MODEL = 'api_v1.User'
 
 # Password validation
@@ -135,18 +154,24 @@ LOGGING = {
             'class': 'logging.StreamHandler',
         }
     },
-    'loggers': {
-        'django.db.backends': {
-            'handlers': ['console'],
-            'level': 'DEBUG',
-        },
-    }
+    'loggers': {},
 }
 
+# SQL-запросы пишутся в лог только в режиме отладки
+if DEBUG:
+    LOGGING['loggers']['django.db.backends'] = {
+        'handlers': ['console'],
+        'level': 'DEBUG',
+    }
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
+    'DEFAULT_THROTTLE_RATES': {
+        'orders': '120/min',
+        'deliveries': '60/min',
+    },
 }
 
 SWAGGER_SETTINGS = {
@@ -156,9 +181,61 @@ SWAGGER_SETTINGS = {
             'name': 'Authorization',
             'in': 'header'
         }
-    }
+    },
+   'SPEC_URL': ('api_v1:schema-json', {'format': '.json'}),
 }
 
+REDOC_SETTINGS = {
+   'SPEC_URL': ('api_v1:schema-json', {'format': '.json'}),
+}
+
+# Файл со сгенерированной OpenAPI-схемой (manage.py generate_schema)
+SCHEMA_CACHE_FILE = os.path.join(BASE_DIR, 'openapi.json')
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=30),
-}
\ No newline at end of file
+}
+# Лента изменений остатков (api_v1.streams), обслуживается через ASGI
+STOCK_FEED_POLL_INTERVAL = 1.0
+STOCK_FEED_BUFFER_SIZE = 1000
+STOCK_FEED_MAX_TIMEOUT = 30
+# Сколько секунд лента ждет записи с пропущенным id, прежде чем пропустить ее
+STOCK_FEED_GAP_TIMEOUT = 5.0
+
+# Архивация закрытых заказов и поставок (api_v1.archive)
+ARCHIVE_HORIZON_DAYS = 365
+ARCHIVE_CHUNK_SIZE = 5000
+# Размер страницы списков заказов и поставок с архивными записями
+ARCHIVE_LIST_PAGE_SIZE = 1000
+
+# Пакетное удаление категорий и поставщиков (api_v1.deletion).
+# Поведение при наличии истории заказов: refuse, soft или delete
+DELETION_CHUNK_SIZE = 1000
+DELETION_HISTORY_POLICY = 'refuse'
+# Задача без обновлений дольше этого числа секунд считается брошенной
+DELETION_JOB_TIMEOUT = 300
+
+# Сжатие ответов (stms_v1.middleware). brotli - из requirements.txt,
+# без пакета brotli ответы сжимаются только gzip
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 4
+
+# Лимиты записи и сброс нагрузки (api_v1.throttling)
+THROTTLE_SYNC_INTERVAL = 5
+DB_LATENCY_THRESHOLD = 0.5
+DB_LATENCY_PROBE_INTERVAL = 1
+DB_LATENCY_RETRY_AFTER = 5
+
+# Максимальный размер волны сборки заказов (api_v1.picking)
+PICK_WAVE_MAX_SIZE = 10000
+
+# Отмена просроченных черновиков (manage.py expire_drafts)
+DRAFT_ORDER_EXPIRY_HOURS = 24
+DRAFT_DELIVERY_EXPIRY_HOURS = 7 * 24
+DRAFT_EXPIRY_BATCH_SIZE = 1000
+
+# Журнал аудита остатков (api_v1.audit): размер буфера событий и файл,
+# в который пишутся события, если БД недоступна (manage.py replay_audit)
+AUDIT_BUFFER_SIZE = 500
+AUDIT_FALLBACK_FILE = os.path.join(BASE_DIR, 'audit-fallback.jsonl')
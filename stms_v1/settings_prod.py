@@ -0,0 +1,65 @@
+"""
+Настройки для production.
+
+Отличаются от stms_v1.settings отключенной отладкой, секретами из
+переменных окружения и более быстрым стартом воркера: приложения для
+разработки не подключаются, а drf_yasg не входит в INSTALLED_APPS (его
+пакет при импорте загружает pkg_resources) - шаблоны и статика
+документации подключаются по пути к пакету без его импорта, сам drf_yasg
+импортируется при первом запросе к документации (api_v1.urls.lazy_view).
+
+Запуск: gunicorn -c gunicorn.conf.py (см. gunicorn.conf.py в корне).
+"""
+import copy
+import importlib.util
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, INSTALLED_APPS, DEV_APPS, TEMPLATES
+
+DEBUG = False
+
+SECRET_KEY = os.environ['STMS_SECRET_KEY']
+
+ALLOWED_HOSTS = os.environ.get('STMS_ALLOWED_HOSTS', '127.0.0.1').split(',')
+
+_YASG_DIR = importlib.util.find_spec('drf_yasg').submodule_search_locations[0]
+
+INSTALLED_APPS = [
+    app for app in INSTALLED_APPS if app not in DEV_APPS and app != 'drf_yasg'
+]
+
+TEMPLATES = copy.deepcopy(TEMPLATES)
+TEMPLATES[0]['DIRS'] = TEMPLATES[0]['DIRS'] + [os.path.join(_YASG_DIR, 'templates')]
+
+STATIC_ROOT = os.environ.get('STMS_STATIC_ROOT', os.path.join(BASE_DIR, 'static'))
+STATICFILES_DIRS = [os.path.join(_YASG_DIR, 'static')]
+
+# Общий кэш воркеров (см. CACHES в stms_v1.settings): memcached, если
+# задан STMS_MEMCACHED (адреса через запятую, нужен пакет python-memcached),
+# иначе таблица в БД
+if os.environ.get('STMS_MEMCACHED'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+            'LOCATION': os.environ['STMS_MEMCACHED'].split(','),
+        }
+    }
+
+# Соединения с БД переиспользуются между запросами воркера
+CONN_MAX_AGE = int(os.environ.get('STMS_CONN_MAX_AGE', 60))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'level': 'INFO',
+            'class': 'logging.StreamHandler',
+        }
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': 'WARNING',
+    },
+}